@@ -0,0 +1,229 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import db
+
+TOKEN_PATTERN = r"[^\W_]+"
+# Assignments whose similar-answer pairs are kept between reruns.
+PAIRS_CACHE_SIZE = 64
+# Candidate pairs scored at once by similar_pairs; bounds its memory.
+BLOCK_PAIRS = 250_000
+# Similar-answer merging runs on the page's rerun, so it is refused above
+# this many distinct answers; identical answers are still grouped.
+MAX_SIMILAR_ANSWERS = 10_000
+
+
+def pending_answers(assignment_id):
+    rows = db.query("""
+        SELECT sa.id, u.name, sa.answer
+        FROM AssignmentStudent sa
+        JOIN User u ON u.id = sa.student_id
+        WHERE sa.assignment_id = ? AND sa.grade IS NULL AND sa.answer IS NOT NULL
+    """, (assignment_id,))
+    return pd.DataFrame(rows, columns=["id", "student", "answer"])
+
+
+def normalize(answers):
+    """Casefold, drop punctuation and collapse whitespace, vectorized."""
+    return (answers.fillna("")
+            .str.casefold()
+            .str.replace(r"[^\w\s]|_", " ", regex=True)
+            .str.split()
+            .str.join(" "))
+
+
+def group_answers(answers, similarity=None, pairs=None):
+    """Label every row of ``answers`` (columns id/student/answer) with a
+    ``group`` number.
+
+    Answers whose normalized text hashes the same share a group. With
+    ``similarity`` set, similar answers are grouped as well: the most
+    common answer not yet grouped leads a new group, and every ungrouped
+    answer whose TF-IDF cosine similarity to that leader is at least
+    ``similarity`` joins it. Members are only compared with the leader, so
+    groups never chain through intermediate answers. Group 0 is the
+    largest; the leader's rows come first in each group (``leader``).
+
+    ``pairs`` is ``similar_pairs`` output over the normalized answers'
+    hashes (or a superset of them); it is computed when not given.
+    """
+    frame = answers.copy()
+    normalized = normalize(frame["answer"])
+    frame["key"] = pd.util.hash_array(normalized.to_numpy(dtype=object))
+    distinct, first, inverse, counts = np.unique(frame["key"].to_numpy(), return_index=True,
+                                                 return_inverse=True, return_counts=True)
+    labels = np.arange(len(distinct))
+
+    if similarity is not None and len(distinct) > 1:
+        if pairs is None:
+            pairs = similar_pairs(distinct, normalized.iloc[first], similarity)
+        labels = _leader_groups(counts, *_restrict(pairs, distinct))
+
+    frame["group"] = labels[inverse]
+    frame["leader"] = (labels == np.arange(len(distinct)))[inverse]
+    # Renumber so the biggest group comes first.
+    sizes = frame["group"].value_counts()
+    order = {group: rank for rank, group in enumerate(sizes.index)}
+    frame["group"] = frame["group"].map(order)
+    frame = frame.sort_values(["group", "leader", "id"], ascending=[True, False, True],
+                              ignore_index=True)
+    return frame.drop(columns="key")
+
+
+def _tfidf(texts):
+    """Sparse TF-IDF rows of ``texts`` as ``(doc, term, weight)`` arrays,
+    each row L2-normalized, plus each term's document frequency."""
+    tokens = texts.reset_index(drop=True).str.findall(TOKEN_PATTERN).explode().dropna()
+    if tokens.empty:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float32), empty
+    pairs = pd.DataFrame({"doc": tokens.index.to_numpy(), "term": tokens.to_numpy()})
+    counts = pairs.groupby(["doc", "term"]).size().reset_index(name="tf")
+    terms, term_ids = np.unique(counts["term"].to_numpy(), return_inverse=True)
+    df = np.bincount(term_ids, minlength=len(terms))
+
+    doc = counts["doc"].to_numpy()
+    idf = np.log((1 + len(texts)) / (1 + df)) + 1
+    weight = (counts["tf"].to_numpy() * idf[term_ids]).astype(np.float32)
+    norms = np.sqrt(np.bincount(doc, weights=weight.astype(np.float64) ** 2, minlength=len(texts)))
+    weight /= norms[doc]
+    return doc, term_ids, weight, df
+
+
+def similar_pairs(keys, texts, threshold):
+    """Pairs of ``keys`` whose ``texts`` have TF-IDF cosine similarity of at
+    least ``threshold``, as two aligned key arrays.
+
+    Only pairs sharing a term are scored. Each vector's terms are taken
+    rarest first into a prefix until the rest has norm below
+    ``threshold``; two vectors whose prefixes share no term cannot reach
+    the threshold, so candidates come from the prefixes alone.
+
+    Raises ValueError for more than MAX_SIMILAR_ANSWERS texts.
+    """
+    if len(keys) > MAX_SIMILAR_ANSWERS:
+        raise ValueError(f"Too many different answers ({len(keys)}) to merge similar ones; "
+                         f"the limit is {MAX_SIMILAR_ANSWERS}")
+    doc, term, weight, df = _tfidf(texts)
+    if not len(doc):
+        return keys[:0], keys[:0]
+    n, vocabulary = len(texts), len(df)
+    lengths = np.bincount(doc, minlength=n)
+    starts = np.cumsum(lengths) - lengths
+
+    # Rarest terms first within each document.
+    order = np.lexsort((term, df[term], doc))
+    squares = pd.Series(weight[order].astype(np.float64) ** 2)
+    # Squared norm of each entry plus everything after it in its document.
+    remaining = squares[::-1].groupby(doc[order][::-1]).cumsum()[::-1].to_numpy()
+    # An entry is in the prefix while the entries from it on still reach
+    # the threshold.
+    heads = order[remaining >= threshold ** 2 - 1e-9]
+
+    # Pair every prefix entry with the later entries of its term, about
+    # BLOCK_PAIRS candidate pairs at a time.
+    heads = heads[np.argsort(term[heads], kind="stable")]
+    partners = np.cumsum(np.bincount(term[heads], minlength=vocabulary))[term[heads]]
+    partners -= np.arange(len(heads)) + 1
+    cuts = np.searchsorted(np.cumsum(partners), np.arange(BLOCK_PAIRS, partners.sum(), BLOCK_PAIRS))
+    entry_keys = doc * vocabulary + term
+
+    def similar_block(block):
+        left = np.repeat(heads[block], partners[block])
+        right = heads[_expand(block + 1, partners[block])]
+        candidates = _unique(np.minimum(doc[left], doc[right]) * n
+                             + np.maximum(doc[left], doc[right]))
+        first, second = candidates // n, candidates % n
+
+        # Exact cosine for the candidates only: look each term of ``first``
+        # up in ``second`` (entries are sorted by document, then term).
+        positions = _expand(starts[first], lengths[first])
+        pair = np.repeat(np.arange(len(candidates)), lengths[first])
+        wanted = np.repeat(second, lengths[first]) * vocabulary + term[positions]
+        found = np.minimum(np.searchsorted(entry_keys, wanted), len(entry_keys) - 1)
+        hit = entry_keys[found] == wanted
+        cosine = np.bincount(pair[hit], weights=weight[positions[hit]] * weight[found[hit]],
+                             minlength=len(candidates))
+        return candidates[cosine >= threshold - 1e-6]
+
+    # A pair sharing prefix terms in several blocks is found in each.
+    similar = _unique(np.concatenate(
+        [similar_block(block) for block in np.split(np.arange(len(heads)), np.unique(cuts))]
+    ))
+    return keys[similar // n], keys[similar % n]
+
+
+def _unique(values):
+    """Sorted distinct ``values``; faster than np.unique on large int arrays."""
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]] if len(values) else values
+
+
+def _expand(starts, lengths):
+    """Concatenated ``range(start, start + length)`` for each pair."""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def _restrict(pairs, keys):
+    """``pairs`` (key arrays) limited to ``keys``, as positions into it."""
+    first, second = pairs
+    keep = np.isin(first, keys) & np.isin(second, keys)
+    return np.searchsorted(keys, first[keep]), np.searchsorted(keys, second[keep])
+
+
+def _leader_groups(counts, sources, targets):
+    """Leader label for each distinct answer given the similar pairs."""
+    n = len(counts)
+    ends = np.concatenate([sources, targets])
+    others = np.concatenate([targets, sources])
+    order = np.argsort(ends, kind="stable")
+    ends, others = ends[order], others[order]
+    starts = np.searchsorted(ends, np.arange(n + 1))
+
+    labels = np.full(n, -1)
+    for leader in np.argsort(-counts, kind="stable"):
+        if labels[leader] >= 0:
+            continue
+        labels[leader] = leader
+        neighbours = others[starts[leader]:starts[leader + 1]]
+        labels[neighbours[labels[neighbours] < 0]] = leader
+    return labels
+
+
+_pairs_cache = OrderedDict()
+_pairs_lock = threading.Lock()
+
+
+def _assignment_pairs(assignment_id, keys, texts, similarity):
+    """``similar_pairs`` for an assignment, kept per assignment rather than
+    in the query cache: grading shrinks the pending answers to a subset of
+    what was scored, so the pairs stay valid until new answers arrive."""
+    cache_key = (assignment_id, similarity)
+    with _pairs_lock:
+        cached = _pairs_cache.get(cache_key)
+        if cached is not None and np.isin(keys, cached[0]).all():
+            _pairs_cache.move_to_end(cache_key)
+            return cached[1]
+    pairs = similar_pairs(keys, texts, similarity)
+    with _pairs_lock:
+        _pairs_cache[cache_key] = (keys, pairs)
+        _pairs_cache.move_to_end(cache_key)
+        while len(_pairs_cache) > PAIRS_CACHE_SIZE:
+            _pairs_cache.popitem(last=False)
+    return pairs
+
+
+def assignment_groups(assignment_id, similarity=None):
+    """``group_answers`` of an assignment's ungraded answers."""
+    answers = pending_answers(assignment_id)
+    pairs = None
+    if similarity is not None and len(answers) > 1:
+        normalized = normalize(answers["answer"])
+        hashes = pd.util.hash_array(normalized.to_numpy(dtype=object))
+        keys, first = np.unique(hashes, return_index=True)
+        pairs = _assignment_pairs(assignment_id, keys, normalized.iloc[first], similarity)
+    return group_answers(answers, similarity, pairs)
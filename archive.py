@@ -0,0 +1,222 @@
+import os
+import time
+from typing import NamedTuple
+from urllib.parse import quote
+
+import db
+from metrics import metrics
+
+ARCHIVE_PATH = os.environ.get('HOMEWORK_ARCHIVE_DB', 'HomeworkArchive.db')
+# Rows moved per transaction; each chunk holds the write lock for one
+# copy and one delete of about this many AssignmentStudent rows.
+CHUNK_ROWS = 2000
+# Pause between chunks so queued submissions and grades get the writer.
+CHUNK_PAUSE = 0.01
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS archive.archived_assignments (
+        id INTEGER PRIMARY KEY,
+        subject_id INTEGER NOT NULL,
+        subject_code TEXT NOT NULL,
+        subject_name TEXT NOT NULL,
+        question_number INTEGER NOT NULL,
+        question_text TEXT NOT NULL,
+        created_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archive.archived_answers (
+        id INTEGER PRIMARY KEY,
+        assignment_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        username TEXT NOT NULL,
+        student_name TEXT,
+        answer TEXT,
+        grade INTEGER,
+        feedback TEXT,
+        submitted_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_archived_assignments_subject "
+    "ON archived_assignments (subject_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archived_answers_assignment "
+    "ON archived_answers (assignment_id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archived_answers_student "
+    "ON archived_answers (student_id, assignment_id)",
+)
+
+
+class ArchiveProgress(NamedTuple):
+    assignments: int
+    rows: int
+    total_rows: int
+
+
+def _attached(conn):
+    return any(row[1] == 'archive' for row in conn.execute("PRAGMA database_list"))
+
+
+def _attach_writable(conn, path):
+    if not _attached(conn):
+        conn.execute("ATTACH DATABASE ? AS archive", (path,))
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+
+def _attach_read_only(conn, path=None):
+    """Attach the archive to a reader connection; False if there is none yet."""
+    if _attached(conn):
+        return True
+    path = path or ARCHIVE_PATH
+    if not os.path.exists(path):
+        return False
+    conn.execute("ATTACH DATABASE ? AS archive",
+                 (f"file:{quote(os.path.abspath(path))}?mode=ro",))
+    return True
+
+
+def archivable(before):
+    """``(assignment id, AssignmentStudent rows)`` of assignments created
+    before ``before`` with no answer still waiting for a grade."""
+    return db.query("""
+        SELECT a.id, COALESCE(q.assigned, 0)
+        FROM assignments a
+        LEFT JOIN question_summary q ON q.assignment_id = a.id
+        WHERE a.created_at < ? AND COALESCE(q.answered - q.graded, 0) = 0
+        ORDER BY a.id
+    """, (before,))
+
+
+def _chunks(assignments, chunk_rows):
+    chunk, rows = [], 0
+    for assignment_id, count in assignments:
+        chunk.append(assignment_id)
+        rows += count
+        if rows >= chunk_rows:
+            yield chunk, rows
+            chunk, rows = [], 0
+    if chunk:
+        yield chunk, rows
+
+
+def archive_term(before, path=None, chunk_rows=CHUNK_ROWS):
+    """Move every ``archivable(before)`` assignment and its AssignmentStudent
+    rows into the archive database, yielding an ArchiveProgress per chunk.
+
+    Each chunk is copied in one transaction and deleted from the live
+    tables in the next. With the live database in WAL mode a transaction
+    spanning both files is not atomic, so the copy is committed first; the
+    delete skips any assignment whose rows changed after the copy, and
+    the stale copies are dropped again. Re-running is safe: copies of
+    assignments that are still live are removed before anything moves.
+    """
+    path = path or ARCHIVE_PATH
+    assignments = archivable(before)
+    row_counts = dict(assignments)
+    total_rows = sum(row_counts.values())
+    with db.get_pool().writer() as conn:
+        _attach_writable(conn, path)
+    with db.transaction() as cursor:
+        cursor.execute("""
+            DELETE FROM archive.archived_answers
+            WHERE assignment_id IN (SELECT id FROM main.assignments)
+        """)
+        cursor.execute("""
+            DELETE FROM archive.archived_assignments
+            WHERE id IN (SELECT id FROM main.assignments)
+        """)
+
+    moved_assignments = moved_rows = 0
+    for chunk, rows in _chunks(assignments, chunk_rows):
+        placeholders = ", ".join("?" * len(chunk))
+        with db.transaction() as cursor:
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO archive.archived_assignments
+                    (id, subject_id, subject_code, subject_name, question_number,
+                     question_text, created_at)
+                SELECT a.id, a.subject_id, s.code, s.name, a.question_number,
+                       a.question_text, a.created_at
+                FROM assignments a
+                JOIN subjects s ON s.id = a.subject_id
+                WHERE a.id IN ({placeholders})
+            """, chunk)
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO archive.archived_answers
+                    (id, assignment_id, student_id, username, student_name,
+                     answer, grade, feedback, submitted_at)
+                SELECT sa.id, sa.assignment_id, sa.student_id, u.username, u.name,
+                       sa.answer, sa.grade, sa.feedback, sa.submitted_at
+                FROM AssignmentStudent sa
+                JOIN User u ON u.id = sa.student_id
+                WHERE sa.assignment_id IN ({placeholders})
+            """, chunk)
+
+        with db.transaction() as cursor:
+            # AssignmentStudent rows, summaries and search entries follow
+            # through the cascade and triggers.
+            cursor.execute(f"""
+                DELETE FROM assignments
+                WHERE id IN ({placeholders}) AND NOT EXISTS (
+                    SELECT 1 FROM AssignmentStudent sa
+                    LEFT JOIN archive.archived_answers x ON x.id = sa.id
+                    WHERE sa.assignment_id = assignments.id
+                    AND (x.id IS NULL OR sa.answer IS NOT x.answer
+                         OR sa.grade IS NOT x.grade OR sa.feedback IS NOT x.feedback)
+                )
+            """, chunk)
+            kept = [row[0] for row in cursor.execute(
+                f"SELECT id FROM assignments WHERE id IN ({placeholders})", chunk
+            )]
+        if kept:
+            kept_placeholders = ", ".join("?" * len(kept))
+            with db.transaction() as cursor:
+                cursor.execute(f"""
+                    DELETE FROM archive.archived_answers
+                    WHERE assignment_id IN ({kept_placeholders})
+                """, kept)
+                cursor.execute(f"""
+                    DELETE FROM archive.archived_assignments
+                    WHERE id IN ({kept_placeholders})
+                """, kept)
+
+        moved_assignments += len(chunk) - len(kept)
+        moved_rows += rows - sum(row_counts[assignment_id] for assignment_id in kept)
+        yield ArchiveProgress(moved_assignments, moved_rows, total_rows)
+        time.sleep(CHUNK_PAUSE)
+
+
+def _history(sql, params=()):
+    with db.get_pool().reader() as conn:
+        if not _attach_read_only(conn):
+            return []
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+    metrics.record_query(sql, time.perf_counter() - start, len(rows))
+    return rows
+
+
+def archived_subjects():
+    """Per archived subject: ``(code, name, assignments, answers, graded,
+    average grade, first created, last created)``."""
+    return _history("""
+        SELECT a.subject_code, a.subject_name, COUNT(DISTINCT a.id), COUNT(x.answer),
+               COUNT(x.grade), AVG(x.grade), MIN(a.created_at), MAX(a.created_at)
+        FROM archive.archived_assignments a
+        LEFT JOIN archive.archived_answers x ON x.assignment_id = a.id
+        GROUP BY a.subject_id, a.subject_code, a.subject_name
+        ORDER BY a.subject_name
+    """)
+
+
+def student_history(student_id, subject_id):
+    """A student's archived work in one subject: ``(created at, question
+    number, answer, grade, feedback)``, oldest first."""
+    return _history("""
+        SELECT a.created_at, a.question_number, x.answer, x.grade, x.feedback
+        FROM archive.archived_answers x
+        JOIN archive.archived_assignments a ON a.id = x.assignment_id
+        WHERE x.student_id = ? AND a.subject_id = ?
+        ORDER BY a.created_at, a.question_number
+    """, (student_id, subject_id))
@@ -0,0 +1,103 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import db
+
+ALGORITHM = 'pbkdf2_sha256'
+# About 60ms per hash on one core; raising it makes every login slower, so
+# check verification_stats() after changing it.
+ITERATIONS = 100_000
+SALT_BYTES = 16
+
+# Hashing is CPU-bound (and releases the GIL), so at most one verification
+# per core runs at a time. A login burst queues here instead of slowing
+# every login down together.
+_hash_slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+_timings = deque(maxlen=1000)
+# Verified against when the username is unknown, so a failed login costs
+# the same as a wrong password.
+_DUMMY_HASH = None
+
+
+class SessionUser(NamedTuple):
+    id: int
+    username: str
+    role: str
+    name: str
+
+
+def _pbkdf2(password, salt, iterations):
+    with _hash_slots:
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+
+def hash_password(password):
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _pbkdf2(password, salt, ITERATIONS)
+    return f"{ALGORITHM}${ITERATIONS}${salt.hex()}${digest.hex()}"
+
+
+def hash_passwords(passwords):
+    """Hash many passwords using every core; order is preserved."""
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        return list(pool.map(hash_password, passwords))
+
+
+def is_hashed(stored):
+    return stored.startswith(ALGORITHM + '$')
+
+
+def verify_password(password, stored):
+    """Check ``password`` against a stored hash or a legacy plain-text
+    password, recording how long the check took."""
+    start = time.perf_counter()
+    try:
+        if not is_hashed(stored):
+            return hmac.compare_digest(password.encode(), stored.encode())
+        _, iterations, salt, digest = stored.split('$')
+        candidate = _pbkdf2(password, bytes.fromhex(salt), int(iterations))
+        return hmac.compare_digest(candidate, bytes.fromhex(digest))
+    finally:
+        _timings.append(time.perf_counter() - start)
+
+
+def needs_rehash(stored):
+    return not is_hashed(stored) or stored.split('$')[1] != str(ITERATIONS)
+
+
+def verification_stats():
+    """Count, median and 95th percentile (seconds) of recent verifications."""
+    timings = sorted(_timings)
+    if not timings:
+        return 0, 0.0, 0.0
+    return (len(timings), timings[len(timings) // 2],
+            timings[min(len(timings) - 1, int(len(timings) * 0.95))])
+
+
+def authenticate(username, password, role):
+    """Return the SessionUser for valid credentials, else None."""
+    global _DUMMY_HASH
+    row = db.query_one(
+        "SELECT id, username, password, role, name FROM User WHERE username = ?",
+        (username,)
+    )
+    if row is None:
+        if _DUMMY_HASH is None:
+            _DUMMY_HASH = hash_password(secrets.token_hex(8))
+        verify_password(password, _DUMMY_HASH)
+        return None
+
+    user_id, username, stored, user_role, name = row
+    if not verify_password(password, stored) or user_role != role:
+        return None
+    if needs_rehash(stored):
+        db.execute("UPDATE User SET password = ? WHERE id = ?",
+                   (hash_password(password), user_id))
+    return SessionUser(user_id, username, user_role, name)
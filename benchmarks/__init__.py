@@ -0,0 +1,6 @@
+"""Synthetic data and headless page benchmarks.
+
+    python -m benchmarks.generate --path bench.db --students 20000
+    python -m benchmarks.run --path bench.db --iterations 20
+    python -m benchmarks.startup --path bench.db --samples 5
+"""
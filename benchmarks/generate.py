@@ -0,0 +1,132 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+PASSWORD = 'bench'
+ADMIN = 'bench_admin'
+CHUNK_SIZE = 50_000
+ANSWERS = ("Paris", "paris.", "London", "It is Paris", "I don't know", "Rome", "Berlin")
+
+
+def teacher_name(index):
+    return f"teacher{index}"
+
+
+def student_name(index):
+    return f"student{index}"
+
+
+def _assignment_rows(rng, args, subject_assignments, enrollments):
+    """AssignmentStudent rows for every enrollment, some answered and some
+    of those graded."""
+    now = datetime.now()
+    for student_id, subject in enrollments:
+        for assignment_id in subject_assignments[subject]:
+            answer = grade = feedback = submitted_at = None
+            if rng.random() < args.answered:
+                answer = rng.choice(ANSWERS)
+                submitted_at = (now - timedelta(seconds=rng.randrange(90 * 86400))
+                                ).strftime("%Y-%m-%d %H:%M:%S")
+                if rng.random() < args.graded:
+                    grade = rng.randrange(3)
+                    feedback = "Well done" if grade == 2 and rng.random() < 0.3 else None
+            yield assignment_id, student_id, answer, grade, feedback, submitted_at
+
+
+def generate(args):
+    """Create a fresh database at ``args.path`` through the app's own
+    migrations and fill it with synthetic accounts and homework."""
+    import auth
+    import db
+    import migrations
+
+    migrations.ensure_migrated()
+    rng = random.Random(args.seed)
+    password = auth.hash_password(PASSWORD)
+
+    with db.transaction() as cursor:
+        cursor.execute("INSERT INTO User (username, password, role, name) VALUES (?, ?, 'Admin', ?)",
+                       (ADMIN, password, "Bench Admin"))
+        cursor.executemany("INSERT INTO subjects (code, name) VALUES (?, ?)",
+                           [(f"S{i:04d}", f"Subject {i:04d}") for i in range(args.subjects)])
+        subject_ids = [row[0] for row in cursor.execute("SELECT id FROM subjects ORDER BY code")]
+        cursor.executemany("INSERT INTO User (username, password, role, name) VALUES (?, ?, 'Teacher', ?)",
+                           [(teacher_name(i), password, f"Teacher {i}") for i in range(args.subjects)])
+        cursor.executemany("""
+            INSERT INTO user_subjects (user_id, subject_id)
+            SELECT id, ? FROM User WHERE username = ?
+        """, [(subject_id, teacher_name(i)) for i, subject_id in enumerate(subject_ids)])
+        cursor.executemany("INSERT INTO User (username, password, role, name) VALUES (?, ?, 'Student', ?)",
+                           [(student_name(i), password, f"Student {i}") for i in range(args.students)])
+        student_ids = [row[0] for row in cursor.execute(
+            "SELECT id FROM User WHERE role = 'Student' ORDER BY id")]
+        enrollments = [(student_id, subject)
+                       for student_id in student_ids
+                       for subject in rng.sample(range(args.subjects), args.subjects_per_student)]
+        cursor.executemany("INSERT INTO user_subjects (user_id, subject_id) VALUES (?, ?)",
+                           [(student_id, subject_ids[subject]) for student_id, subject in enrollments])
+        subject_assignments = []
+        for subject_id in subject_ids:
+            assignment_ids = []
+            for number in range(1, args.questions + 1):
+                cursor.execute("""
+                    INSERT INTO assignments (subject_id, question_number, question_text)
+                    VALUES (?, ?, ?)
+                """, (subject_id, number, f"Question {number}: what is the capital of France?"))
+                assignment_ids.append(cursor.lastrowid)
+            subject_assignments.append(assignment_ids)
+
+    rows = _assignment_rows(rng, args, subject_assignments, enrollments)
+    written = 0
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        with db.transaction() as cursor:
+            cursor.executemany("""
+                INSERT INTO AssignmentStudent
+                    (assignment_id, student_id, answer, grade, feedback, submitted_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, chunk)
+        written += len(chunk)
+        print(f"{written} AssignmentStudent rows", file=sys.stderr)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic homework database.")
+    parser.add_argument("--path", default=os.environ.get('HOMEWORK_DB', 'bench.db'),
+                        help="database file to create (default: $HOMEWORK_DB or bench.db)")
+    parser.add_argument("--subjects", type=int, default=50)
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--subjects-per-student", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=10, help="assignments per subject")
+    parser.add_argument("--answered", type=float, default=0.7, help="share of rows with an answer")
+    parser.add_argument("--graded", type=float, default=0.5, help="share of answers graded")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="overwrite an existing file")
+    args = parser.parse_args(argv)
+    if args.subjects_per_student > args.subjects:
+        parser.error("--subjects-per-student cannot exceed --subjects")
+
+    if os.path.exists(args.path):
+        if not args.force:
+            parser.error(f"{args.path} exists; pass --force to overwrite it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+    # db reads HOMEWORK_DB when it is first imported.
+    os.environ['HOMEWORK_DB'] = args.path
+
+    start = time.perf_counter()
+    rows = generate(args)
+    print(f"{args.path}: {args.subjects} subjects, {args.students} students, "
+          f"{rows} AssignmentStudent rows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
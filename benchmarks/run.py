@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.generate import ADMIN, PASSWORD, student_name, teacher_name
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _db_time():
+    from metrics import metrics
+    return sum(row['total_ms'] for row in metrics.query_stats()) / 1000
+
+
+class Session:
+    """One browser session driven headlessly through AppTest. Every rerun
+    is timed under an action name, together with the database time
+    recorded by the metrics module while it ran."""
+
+    def __init__(self, timings, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(MAIN, default_timeout=timeout)
+        self.timings = timings
+
+    def run(self, action):
+        db_start = _db_time()
+        start = time.perf_counter()
+        self.app.run()
+        elapsed = time.perf_counter() - start
+        if self.app.exception:
+            raise RuntimeError(f"{action}: {self.app.exception[0].value}")
+        self.timings[action].append((elapsed, _db_time() - db_start))
+
+    def button(self, label):
+        return next((b for b in self.app.button if b.label == label), None)
+
+    def login(self, username, role):
+        self.run("open")
+        self.app.text_input[0].input(username)
+        self.app.text_input[1].input(PASSWORD)
+        self.app.selectbox[0].select(role)
+        self.button("Login").click()
+        self.run(f"login {role.lower()}")
+
+    def action(self, name, action):
+        self.app.radio[0].set_value(action)
+        self.run(name)
+
+
+def student_session(session, rng, students):
+    session.login(student_name(rng.randrange(students)), "Student")
+    if session.button("Submit Answer"):
+        session.app.text_area[0].input(f"benchmark answer {rng.random()}")
+        session.button("Submit Answer").click()
+        session.run("student submit answer")
+    session.action("student view grades", "View Grades")
+    if session.button("Next") and not session.button("Next").disabled:
+        session.button("Next").click()
+        session.run("student next grades page")
+
+
+def teacher_session(session, rng, teachers):
+    session.login(teacher_name(rng.randrange(teachers)), "Teacher")
+    session.action("teacher grading queue", "Grade Assignment")
+    if session.button("Submit Grade"):
+        next(s for s in session.app.selectbox if s.label == "Grade").select(rng.randrange(3))
+        session.button("Submit Grade").click()
+        session.run("teacher submit grade")
+    session.action("teacher batch grade", "Batch Grade")
+    session.action("teacher gradebook", "Gradebook")
+    session.action("teacher search", "Search")
+    session.app.text_input[0].input(rng.choice(("paris", "rome capital", "know")))
+    session.run("teacher search answers")
+
+
+def admin_session(session, rng):
+    session.login(ADMIN, "Admin")
+    session.app.selectbox[0].select("Analytics")
+    session.run("admin analytics")
+
+
+def benchmark(iterations, seed=0, timeout=60):
+    """Run ``iterations`` student, teacher and admin sessions; returns
+    {action: [(seconds, db_seconds), ...]}."""
+    import db
+    import write_queue
+
+    students, teachers = db.query_one("""
+        SELECT SUM(role = 'Student'), SUM(role = 'Teacher') FROM User
+    """)
+    rng = random.Random(seed)
+    timings = defaultdict(list)
+    for _ in range(iterations):
+        student_session(Session(timings, timeout), rng, students)
+        teacher_session(Session(timings, timeout), rng, teachers)
+        admin_session(Session(timings, timeout), rng)
+    write_queue.get_write_queue().close()
+    return timings
+
+
+def summarize(timings):
+    rows = []
+    for action, samples in timings.items():
+        elapsed = [sample[0] for sample in samples]
+        db_time = [sample[1] for sample in samples]
+        rows.append({
+            'action': action,
+            'runs': len(samples),
+            'p50_ms': _percentile(elapsed, 0.5) * 1000,
+            'p95_ms': _percentile(elapsed, 0.95) * 1000,
+            'max_ms': max(elapsed) * 1000,
+            'db_ms': sum(db_time) / len(db_time) * 1000,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every page headlessly.")
+    parser.add_argument("--path", default=os.environ.get('HOMEWORK_DB', 'bench.db'),
+                        help="database from benchmarks.generate (default: $HOMEWORK_DB or bench.db)")
+    parser.add_argument("--iterations", type=int, default=10, help="sessions per role")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per rerun")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-p95-ms", type=float,
+                        help="exit with status 1 if any action's p95 is slower")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist; create it with python -m benchmarks.generate")
+    # db reads HOMEWORK_DB when it is first imported.
+    os.environ['HOMEWORK_DB'] = args.path
+
+    import queries
+
+    rows = summarize(benchmark(args.iterations, args.seed, args.timeout))
+    scans = queries.full_scan_report()
+
+    print(f"{'action':<28}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'db ms':>10}")
+    for row in rows:
+        print(f"{row['action']:<28}{row['runs']:>6}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['max_ms']:>10.1f}{row['db_ms']:>10.1f}")
+    for name, steps in scans.items():
+        print(f"full scan in {name}: {'; '.join(steps)}")
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'path': args.path, 'actions': rows, 'full_scans': scans}, out, indent=2)
+
+    slow = [row['action'] for row in rows
+            if args.max_p95_ms is not None and row['p95_ms'] > args.max_p95_ms]
+    if slow:
+        print(f"p95 over {args.max_p95_ms:g}ms: {', '.join(slow)}")
+    if slow or scans:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run import MAIN, _percentile
+
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'openpyxl')
+
+# Runs in a fresh interpreter per sample so every import is cold.
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.run()
+first_paint = time.perf_counter()
+if app.exception:
+    sys.exit(app.exception[0].value)
+AppTest.from_file(sys.argv[1], default_timeout=120).run()
+second_paint = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'first_paint_s': first_paint - imported,
+    'second_session_s': second_paint - first_paint,
+    'heavy_modules': [name for name in sys.argv[2:] if name in sys.modules],
+}))
+"""
+
+
+def sample():
+    """Time a cold start in a new process: importing Streamlit, the first
+    session's login page and a second session's, once startup is done."""
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, MAIN, *HEAVY_MODULES],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold start and first paint.")
+    parser.add_argument("--path", default=os.environ.get('HOMEWORK_DB', 'bench.db'),
+                        help="database to start against (default: $HOMEWORK_DB or bench.db)")
+    parser.add_argument("--samples", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-first-paint-ms", type=float,
+                        help="exit with status 1 if the median first paint is slower")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist; create it with python -m benchmarks.generate")
+    os.environ['HOMEWORK_DB'] = args.path
+
+    samples = [sample() for _ in range(args.samples)]
+    rows = {}
+    for step in ('import', 'first_paint', 'second_session'):
+        values = [s[f'{step}_s'] for s in samples]
+        rows[step] = {
+            'p50_ms': _percentile(values, 0.5) * 1000,
+            'max_ms': max(values) * 1000,
+        }
+    heavy = sorted({name for s in samples for name in s['heavy_modules']})
+
+    print(f"{'step':<18}{'p50 ms':>10}{'max ms':>10}")
+    for step, row in rows.items():
+        print(f"{step:<18}{row['p50_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    print(f"heavy modules loaded by the login page: {', '.join(heavy) or 'none'}")
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'path': args.path, 'steps': rows, 'heavy_modules': heavy}, out, indent=2)
+
+    if args.max_first_paint_ms is not None and rows['first_paint']['p50_ms'] > args.max_first_paint_ms:
+        print(f"first paint over {args.max_first_paint_ms:g}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
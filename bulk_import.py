@@ -0,0 +1,210 @@
+import time
+
+import pandas as pd
+
+import auth
+import db
+import queries
+
+COLUMNS = ('username', 'name', 'password', 'role', 'subjects')
+QUESTION_COLUMNS = ('question_number', 'question_text')
+ROLES = {'student': 'Student', 'teacher': 'Teacher'}
+CHUNK_SIZE = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.enrolled = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+def read_chunks(uploaded_file, chunk_size=CHUNK_SIZE):
+    """Yield lists of ``(line, row)`` pairs without loading the whole file.
+
+    ``line`` is the 1-based line/row number in the file (header is line 1)
+    and ``row`` maps the lower-cased column names in COLUMNS to strings.
+    """
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        yield from _read_xlsx(uploaded_file, chunk_size)
+        return
+
+    line = 1
+    for frame in pd.read_csv(uploaded_file, chunksize=chunk_size, dtype=str,
+                             keep_default_na=False, skipinitialspace=True):
+        frame.columns = [str(c).strip().lower() for c in frame.columns]
+        frame = frame.reindex(columns=COLUMNS, fill_value='')
+        chunk = []
+        for row in frame.itertuples(index=False):
+            line += 1
+            chunk.append((line, dict(zip(COLUMNS, row))))
+        yield chunk
+
+
+def _read_xlsx(uploaded_file, chunk_size):
+    from openpyxl import load_workbook
+
+    sheet = load_workbook(uploaded_file, read_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(c).strip().lower() if c is not None else '' for c in next(rows, ())]
+    chunk = []
+    for line, values in enumerate(rows, start=2):
+        row = dict.fromkeys(COLUMNS, '')
+        for column, value in zip(header, values):
+            if column in row and value is not None:
+                row[column] = str(value)
+        chunk.append((line, row))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_questions(uploaded_file):
+    """Read a question_number/question_text sheet.
+
+    Returns a DataFrame of the valid rows and a list of ``(line, message)``
+    for the rows left out, numbered like import errors (header is line 1).
+    """
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        frame = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        frame = pd.read_csv(uploaded_file, dtype=str)
+    frame.columns = [str(c).strip().lower() for c in frame.columns]
+    missing = [column for column in QUESTION_COLUMNS if column not in frame.columns]
+    if missing:
+        return (pd.DataFrame(columns=QUESTION_COLUMNS),
+                [(1, f"Missing column(s): {', '.join(missing)}")])
+
+    questions, errors = [], []
+    rows = zip(frame['question_number'].fillna(''), frame['question_text'].fillna(''))
+    for line, (number, text) in enumerate(rows, start=2):
+        number, text = number.strip(), text.strip()
+        try:
+            value = float(number)
+        except ValueError:
+            value = 0.0
+        if not value.is_integer() or value < 1:
+            errors.append((line, f"Question number must be a whole number from 1, got '{number}'"))
+        elif not text:
+            errors.append((line, "Missing question text"))
+        else:
+            questions.append((int(value), text))
+    return pd.DataFrame(questions, columns=QUESTION_COLUMNS), errors
+
+
+def _ids_by_username(execute, usernames):
+    ids = {}
+    usernames = list(usernames)
+    # Stay well below SQLite's bound-parameter limit.
+    for i in range(0, len(usernames), 900):
+        batch = usernames[i:i + 900]
+        ids.update(execute(
+            f"SELECT username, id FROM User WHERE username IN ({','.join('?' * len(batch))})",
+            batch
+        ))
+    return ids
+
+
+def import_accounts(chunks):
+    """Create accounts and enrollments from ``read_chunks`` output.
+
+    A row whose username is new creates a Teacher/Student account and enrolls
+    it in the listed subject codes (separated by ``;``). A row naming an
+    existing username with no password only adds its enrollments. Invalid
+    rows are reported and skipped.
+
+    Rows are validated and passwords hashed before the write lock is taken;
+    everything is then written in a single short transaction.
+    """
+    report = ImportReport()
+    start = time.perf_counter()
+    # One in-memory lookup validates every subject code in the file.
+    subject_ids = {code.casefold(): subject_id
+                   for subject_id, code, name in queries.list_subjects()}
+    seen = set()
+    accounts = []
+    enrollments = []
+
+    for chunk in chunks:
+        report.rows += len(chunk)
+        existing = _ids_by_username(db.query, {row['username'].strip() for line, row in chunk})
+
+        new_accounts = []
+        for line, row in chunk:
+            username = row['username'].strip()
+            password = row['password'].strip()
+            if not username:
+                report.error(line, "Missing username")
+                continue
+            if username in seen:
+                report.error(line, f"Duplicate username '{username}' in file")
+                continue
+
+            codes = [c.strip() for c in row['subjects'].split(';') if c.strip()]
+            unknown = [c for c in codes if c.casefold() not in subject_ids]
+            if unknown:
+                report.error(line, f"Unknown subject code(s): {', '.join(unknown)}")
+                continue
+
+            if username in existing:
+                if password:
+                    report.error(line, f"Username '{username}' already exists")
+                    continue
+            else:
+                role = ROLES.get(row['role'].strip().lower())
+                if role is None:
+                    report.error(line, f"Role must be Student or Teacher, got '{row['role']}'")
+                    continue
+                if not password:
+                    report.error(line, "Missing password for new account")
+                    continue
+                new_accounts.append(
+                    (line, username, password, role, row['name'].strip() or username)
+                )
+
+            seen.add(username)
+            enrollments.extend((username, subject_ids[c.casefold()]) for c in codes)
+
+        hashes = auth.hash_passwords([account[2] for account in new_accounts])
+        accounts.extend((line, username, hashed, role, name)
+                        for (line, username, _, role, name), hashed in zip(new_accounts, hashes))
+
+    with db.transaction() as cursor:
+        def fetch(sql, params):
+            return cursor.execute(sql, params).fetchall()
+
+        # Accounts created by someone else since validation are skipped,
+        # along with their enrollments.
+        taken = _ids_by_username(fetch, (account[1] for account in accounts))
+        for line, username, *_ in accounts:
+            if username in taken:
+                report.error(line, f"Username '{username}' already exists")
+        accounts = [account for account in accounts if account[1] not in taken]
+        enrollments = [enrollment for enrollment in enrollments if enrollment[0] not in taken]
+        cursor.executemany("""
+            INSERT INTO User (username, password, role, name)
+            VALUES (?, ?, ?, ?)
+        """, [account[1:] for account in accounts])
+        report.created = len(accounts)
+
+        user_ids = _ids_by_username(fetch, {username for username, subject_id in enrollments})
+        cursor.executemany("""
+            INSERT OR IGNORE INTO user_subjects (user_id, subject_id)
+            VALUES (?, ?)
+        """, [(user_ids[username], subject_id) for username, subject_id in enrollments
+              if username in user_ids])
+        report.enrolled = max(cursor.rowcount, 0)
+
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+import db
+
+
+class QueryCache:
+    """Bounded LRU cache for read-mostly query results.
+
+    Entries stay valid until ``version_sql`` returns something new. Every
+    lookup runs it on a dedicated connection that never writes, so commits
+    from this process's writer and from other processes alike are seen.
+    The default, ``PRAGMA data_version``, changes on any commit; a
+    narrower version (see ``LOOKUP_VERSION``) lets the cache survive
+    writes to tables it does not read.
+    """
+
+    def __init__(self, version_sql="PRAGMA data_version", max_entries=512):
+        self.version_sql = version_sql
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._watch = None
+        self._watch_pool = None
+        self._data_version = None
+        # Bumped on every clear so a load that raced an invalidation is not
+        # stored under the new version.
+        self._generation = 0
+
+    def _check_version(self):
+        pool = db.get_pool()
+        if self._watch is None or self._watch_pool is not pool:
+            # First use, or the pool was replaced by one on another file.
+            if self._watch is not None:
+                self._watch.close()
+            self._watch, self._watch_pool = db.connect(pool.path), pool
+            self._data_version = None
+        version = self._watch.execute(self.version_sql).fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+    def get(self, key, load):
+        with self._lock:
+            self._check_version()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            generation = self._generation
+
+        value = load()
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Bumped by triggers on the tables behind queries.py's cached lookups
+# (subjects, enrollments, account names and roles, assignments), so answer
+# and grade writes leave them cached.
+LOOKUP_VERSION = "SELECT version FROM lookup_version"
+
+query_cache = QueryCache(LOOKUP_VERSION)
+# Gradebook frames read the grade summaries, so any commit drops them.
+summary_cache = QueryCache()
@@ -0,0 +1,178 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import metrics
+
+DB_PATH = os.environ.get('HOMEWORK_DB', 'HomeworkEvaluationSystem.db')
+
+# Seconds a connection waits on SQLite's write lock before raising
+# "database is locked".
+BUSY_TIMEOUT = 30
+READER_POOL_SIZE = int(os.environ.get('HOMEWORK_DB_READERS', '8'))
+
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+# "SCAN t VIRTUAL TABLE INDEX n:<idxStr>" with a non-empty idxStr.
+VIRTUAL_INDEX_SCAN = re.compile(r"VIRTUAL TABLE INDEX \d+:\S")
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records each statement's time and affected row count."""
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+
+def connect(path):
+    # uri=True lets archive.py attach its database read-only.
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           isolation_level=None, uri=True)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Process-wide SQLite connections shared by every Streamlit session.
+
+    Reads check a connection out of a bounded pool of reader connections;
+    writes go through a single writer connection serialized by a lock, so
+    sessions queue in-process instead of fighting over SQLite's write lock.
+    Connections run in autocommit mode; ``transaction()`` opens explicit
+    ``BEGIN IMMEDIATE`` transactions.
+    """
+
+    def __init__(self, path=DB_PATH, readers=READER_POOL_SIZE):
+        self.path = path
+        self._readers = queue.LifoQueue(maxsize=readers)
+        self._created = 0
+        self._max_readers = readers
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._writer = connect(path)
+        self._writer.execute("PRAGMA journal_mode = WAL")
+
+    @contextmanager
+    def reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self._max_readers
+                if grow:
+                    self._created += 1
+            conn = connect(self.path) if grow else self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Hold the raw writer connection, e.g. for schema changes that must
+        run outside a transaction."""
+        with self._write_lock:
+            yield self._writer
+
+    @contextmanager
+    def transaction(self):
+        with self._write_lock:
+            conn = self._writer
+            if conn.in_transaction:
+                # Nested use joins the enclosing transaction.
+                yield conn.cursor(TimedCursor)
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn.cursor(TimedCursor)
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def query(sql, params=()):
+    with get_pool().reader() as conn:
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+    metrics.record_query(sql, time.perf_counter() - start, len(rows))
+    return rows
+
+
+def query_one(sql, params=()):
+    with get_pool().reader() as conn:
+        start = time.perf_counter()
+        row = conn.execute(sql, params).fetchone()
+    metrics.record_query(sql, time.perf_counter() - start, row is not None)
+    return row
+
+
+def execute(sql, params=()):
+    with transaction() as cursor:
+        cursor.execute(sql, params)
+        return cursor.lastrowid
+
+
+def transaction():
+    return get_pool().transaction()
+
+
+def full_scans(sql, params=()):
+    """Return the EXPLAIN QUERY PLAN steps of ``sql`` that scan a whole table.
+
+    Scans of a subquery's result, and of a virtual table through one of its
+    own indexes (e.g. an FTS5 MATCH), are not counted.
+    """
+    with get_pool().reader() as conn:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    subqueries = {row[3].split()[-1] for row in plan
+                  if row[3].startswith(('CO-ROUTINE', 'MATERIALIZE'))}
+    return [row[3] for row in plan
+            if row[3].startswith('SCAN') and row[3].split()[1] not in subqueries
+            and not VIRTUAL_INDEX_SCAN.search(row[3])]
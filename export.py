@@ -0,0 +1,135 @@
+import csv
+import io
+import tempfile
+import time
+
+import db
+from metrics import metrics
+
+COLUMNS = [
+    "subject_code", "subject", "username", "student", "question_number",
+    "question", "answer", "grade", "feedback", "submitted_at",
+]
+CHUNK_SIZE = 10_000
+# Exports smaller than this stay in memory; larger ones spill to a temp file.
+SPOOL_SIZE = 8 * 1024 * 1024
+
+EXPORT_QUERY = """
+    SELECT s.code, s.name, u.username, u.name, a.question_number,
+           a.question_text, sa.answer, sa.grade, sa.feedback, sa.submitted_at
+    FROM AssignmentStudent sa
+    JOIN assignments a ON a.id = sa.assignment_id
+    JOIN subjects s ON s.id = a.subject_id
+    JOIN User u ON u.id = sa.student_id
+"""
+
+
+def iter_chunks(subject_id=None, chunk_size=CHUNK_SIZE):
+    """Yield the gradebook in lists of at most ``chunk_size`` rows, holding
+    a single reader connection until the last chunk."""
+    sql, params = EXPORT_QUERY, ()
+    if subject_id is not None:
+        sql += " WHERE a.subject_id = ?"
+        params = (subject_id,)
+    # Only time spent inside SQLite counts, not the writer consuming chunks.
+    elapsed, count = 0.0, 0
+    with db.get_pool().reader() as conn:
+        start = time.perf_counter()
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            elapsed += time.perf_counter() - start
+            if not rows:
+                break
+            count += len(rows)
+            yield rows
+            start = time.perf_counter()
+    metrics.record_query(sql, elapsed, count)
+
+
+def write_csv(chunks, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+    text.detach()
+
+
+def write_parquet(chunks, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("subject_code", pa.string()), ("subject", pa.string()),
+        ("username", pa.string()), ("student", pa.string()),
+        ("question_number", pa.int64()), ("question", pa.string()),
+        ("answer", pa.string()), ("grade", pa.int8()),
+        ("feedback", pa.string()), ("submitted_at", pa.string()),
+    ])
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for rows in chunks:
+            # One row group per chunk; columns are built straight from the
+            # row tuples without a DataFrame in between.
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+FORMATS = {
+    "CSV": (write_csv, "csv", "text/csv"),
+    "Parquet": (write_parquet, "parquet", "application/vnd.apache.parquet"),
+}
+
+
+class SpooledReader(io.RawIOBase):
+    """Read-only raw view of a spooled temp file. st.download_button takes
+    an io.RawIOBase but not a SpooledTemporaryFile; closing this closes
+    (and deletes) the file."""
+
+    def __init__(self, spooled):
+        self._spooled = spooled
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._spooled.seek(offset, whence)
+
+    def tell(self):
+        return self._spooled.tell()
+
+    def readinto(self, buffer):
+        data = self._spooled.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readall(self):
+        return self._spooled.read()
+
+    def close(self):
+        self._spooled.close()
+        super().close()
+
+
+def export(fmt, subject_id=None):
+    """Write the gradebook in ``fmt`` to a spooled temp file and return a
+    SpooledReader at its start, ready to hand to st.download_button."""
+    write, _, _ = FORMATS[fmt]
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    write(iter_chunks(subject_id), out)
+    out.seek(0)
+    return SpooledReader(out)
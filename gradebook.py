@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+import db
+from cache import summary_cache
+
+MAX_GRADE = 2
+
+
+def _ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator),
+                     where=denominator > 0)
+
+
+def _frame(key, sql, params, columns):
+    return summary_cache.get(key, lambda: pd.DataFrame(db.query(sql, params), columns=columns))
+
+
+def student_totals(subject_id):
+    """One row per student enrolled in the subject's assignments."""
+    frame = _frame(('gradebook_students', subject_id), """
+        SELECT u.name, s.assigned, s.answered, s.graded, s.total_score
+        FROM student_subject_summary s
+        JOIN User u ON u.id = s.student_id
+        WHERE s.subject_id = ? AND s.assigned > 0
+        ORDER BY u.name
+    """, (subject_id,), ["Student", "Assigned", "Answered", "Graded", "Score"])
+    return frame.assign(
+        Completion=_ratio(frame["Answered"], frame["Assigned"]),
+        Average=_ratio(frame["Score"], frame["Graded"] * MAX_GRADE),
+    )
+
+
+def question_distribution(subject_id):
+    """Per-question answer counts and grade distribution for a subject."""
+    frame = _frame(('gradebook_questions', subject_id), """
+        SELECT a.question_number, SUM(q.assigned), SUM(q.answered), SUM(q.graded),
+               SUM(q.score_0), SUM(q.score_1), SUM(q.score_2)
+        FROM assignments a
+        JOIN question_summary q ON q.assignment_id = a.id
+        WHERE a.subject_id = ?
+        GROUP BY a.question_number
+        ORDER BY a.question_number
+    """, (subject_id,), ["Question", "Assigned", "Answered", "Graded", "0", "1", "2"])
+    scores = frame[["0", "1", "2"]].to_numpy()
+    return frame.set_index("Question").assign(
+        Completion=_ratio(frame["Answered"], frame["Assigned"]),
+        Average=_ratio(scores @ np.arange(MAX_GRADE + 1), frame["Graded"] * MAX_GRADE),
+    )
+
+
+def subject_completion():
+    """Completion and average score for every subject."""
+    frame = _frame(('gradebook_subjects',), """
+        SELECT sub.code, sub.name, COUNT(s.student_id), COALESCE(SUM(s.assigned), 0),
+               COALESCE(SUM(s.answered), 0), COALESCE(SUM(s.graded), 0),
+               COALESCE(SUM(s.total_score), 0)
+        FROM subjects sub
+        LEFT JOIN student_subject_summary s ON s.subject_id = sub.id AND s.assigned > 0
+        GROUP BY sub.id
+        ORDER BY sub.name
+    """, (), ["Code", "Subject", "Students", "Assigned", "Answered", "Graded", "Score"])
+    return frame.assign(**{
+        "Completion": _ratio(frame["Answered"], frame["Assigned"]),
+        "Graded Share": _ratio(frame["Graded"], frame["Answered"]),
+        "Average": _ratio(frame["Score"], frame["Graded"] * MAX_GRADE),
+    })
@@ -1,30 +1,67 @@
 import streamlit as st
 import sqlite3
 from datetime import datetime
-import pandas as pd
+
+# pandas, and answer_groups/bulk_import/gradebook which are built on it, are
+# imported inside the actions that use them so the login page and a cold
+# start never pay for them.
+import archive
+import auth
+import db
+import export
+import metrics
+import migrations
+import queries
+import write_queue
+from cache import query_cache
+
+GRADING_PAGE_SIZE = 25
+BATCH_GRADING_PAGE_SIZE = 50
+GRADES_PAGE_SIZE = 50
+SEARCH_PAGE_SIZE = 25
+PERCENT_COLUMNS = {
+    name: st.column_config.ProgressColumn(name, format="percent", min_value=0, max_value=1)
+    for name in ("Completion", "Graded Share", "Average")
+}
+
+@st.cache_resource
+def startup():
+    """Once per server process, not per session or rerun: bring the schema
+    up to date, open the connection pool, start the write queue and load
+    the subject list every page starts from."""
+    migrations.ensure_migrated()
+    write_queue.get_write_queue()
+    queries.list_subjects()
+    return db.get_pool()
 
 class HomeworkSystem:
     def __init__(self):
         st.set_page_config(page_title="Homework Evaluation System")
+        startup()
         if 'logged_in' not in st.session_state:
             st.session_state.logged_in = False
         if 'user_type' not in st.session_state:
             st.session_state.user_type = None
         if 'username' not in st.session_state:
             st.session_state.username = None
+        if 'user' not in st.session_state:
+            st.session_state.user = None
             
         self.main()
 
     def main(self):
         if not st.session_state.logged_in:
-            self.login_page()
+            with metrics.page("login_page", ""):
+                self.login_page()
         else:
-            if st.session_state.user_type == 'Admin':
-                self.admin_page()
-            elif st.session_state.user_type == 'Teacher':
-                self.teacher_page()
-            elif st.session_state.user_type == 'Student':
-                self.student_page()
+            role = st.session_state.user_type
+            with metrics.page(f"{role.lower()}_page", role):
+                if role == 'Admin':
+                    self.admin_page()
+                elif role == 'Teacher':
+                    self.teacher_page()
+                elif role == 'Student':
+                    self.student_page()
 
     def login_page(self):
         st.title("Login")
@@ -35,19 +72,13 @@ class HomeworkSystem:
             submit = st.form_submit_button("Login")
 
             if submit:
-                conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT * FROM User 
-                    WHERE username=? AND password=? AND role=?
-                """, (username, password, user_type))
-                user = cursor.fetchone()
-                conn.close()
+                user = auth.authenticate(username, password, user_type)
 
                 if user:
                     st.session_state.logged_in = True
-                    st.session_state.user_type = user_type
-                    st.session_state.username = username
+                    st.session_state.user_type = user.role
+                    st.session_state.username = user.username
+                    st.session_state.user = user
                     st.rerun()
                 else:
                     st.error("Invalid credentials")
@@ -57,7 +88,8 @@ class HomeworkSystem:
         
         option = st.selectbox("Select Action", [
             "Add Teacher", "Add Student", "Add Subject", 
-            "Delete Account", "Delete Subject"
+            "Bulk Import", "Delete Account", "Delete Subject", "Analytics",
+            "Export Grades", "Archive Term", "Performance"
         ])
 
         if option == "Add Teacher":
@@ -66,39 +98,35 @@ class HomeworkSystem:
                 username = st.text_input("Username")
                 password = st.text_input("Password", type="password")
                 
-                conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM subjects")
-                subjects = cursor.fetchall()
-                conn.close()
+                subjects = queries.list_subjects()
                 
                 selected_subjects = st.multiselect(
                     "Select Subjects", 
-                    [subject[1] for subject in subjects]
+                    subjects,
+                    format_func=lambda subject: f"{subject[2]} ({subject[1]})"
                 )
                 
                 if st.form_submit_button("Add Teacher"):
-                    conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        INSERT INTO User (username, password, user_type)
-                        VALUES (?, ?, 'Teacher', ?)
-                    """, (username, password, name))
-                    
-                    teacher_id = cursor.lastrowid
-                    
-                    # Add teacher-subject relationships
-                    for subject_name in selected_subjects:
-                        cursor.execute("SELECT id FROM subjects WHERE name=?", (subject_name,))
-                        subject_id = cursor.fetchone()[0]
-                        cursor.execute("""
-                            INSERT INTO user_subjects (user_id, subject_id)
-                            VALUES (?, ?)
-                        """, (teacher_id, subject_id))
-                    
-                    conn.commit()
-                    conn.close()
-                    st.success("Teacher added successfully!")
+                    # Hash before taking the write lock; it takes tens of ms.
+                    password_hash = auth.hash_password(password)
+                    try:
+                        with db.transaction() as cursor:
+                            cursor.execute("""
+                                INSERT INTO User (username, password, role, name)
+                                VALUES (?, ?, 'Teacher', ?)
+                            """, (username, password_hash, name))
+                            
+                            teacher_id = cursor.lastrowid
+                            
+                            # Add teacher-subject relationships
+                            cursor.executemany("""
+                                INSERT INTO user_subjects (user_id, subject_id)
+                                VALUES (?, ?)
+                            """, [(teacher_id, subject[0]) for subject in selected_subjects])
+                        
+                        st.success("Teacher added successfully!")
+                    except sqlite3.IntegrityError:
+                        st.error(f"Error: Username '{username}' is taken or a selected subject no longer exists")
 
         elif option == "Add Student":
             with st.form(key='add_student_form'):
@@ -106,52 +134,38 @@ class HomeworkSystem:
                 username = st.text_input("Username")
                 password = st.text_input("Password", type="password")
                 
-                conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM subjects")
-                subjects = cursor.fetchall()
-                conn.close()
+                subjects = queries.list_subjects()
                 
                 selected_subjects = st.multiselect(
                     "Select Subjects", 
-                    [subject[1] for subject in subjects]
+                    subjects,
+                    format_func=lambda subject: f"{subject[2]} ({subject[1]})"
                 )
                 
                 if st.form_submit_button("Add Student"):
+                    # Hash before taking the write lock; it takes tens of ms.
+                    password_hash = auth.hash_password(password)
                     try:
-                        conn = sqlite3.connect('HomeworkEvaluationSystem.db', timeout=30)
-                        cursor = conn.cursor()
-                        
-                        # First verify all subjects exist before making any changes
-                        for subject_name in selected_subjects:
-                            cursor.execute("SELECT name FROM subjects WHERE code=?", (subject_name,))
-                            if cursor.fetchone() is None:
-                                st.error(f"Error: Subject '{subject_name}' does not exist in the system")
-                                return
-                        
-                        # If all subjects exist, proceed with adding the student
-                         cursor.execute("""
-                            INSERT INTO User (username, password, role)
-                            VALUES (?, ?, ?)
-                        """, (username, password, 'Student'))
-                        student_id = cursor.lastrowid
-                        
-                        # Add student-subject relationships
-                        for subject_name in selected_subjects:
-                            cursor.execute("SELECT name FROM subjects WHERE code=?", (subject_name,))
-                            subject_id = cursor.fetchone()[0]
+                        with db.transaction() as cursor:
                             cursor.execute("""
+                                INSERT INTO User (username, password, role, name)
+                                VALUES (?, ?, 'Student', ?)
+                            """, (username, password_hash, name))
+                            student_id = cursor.lastrowid
+                            
+                            # Add student-subject relationships; the foreign key
+                            # rejects subjects deleted since the form was drawn
+                            cursor.executemany("""
                                 INSERT INTO user_subjects (user_id, subject_id)
                                 VALUES (?, ?)
-                            """, (student_id, subject_id))
+                            """, [(student_id, subject[0]) for subject in selected_subjects])
                         
-                        conn.commit()
                         st.success("Student added successfully!")
+                    except sqlite3.IntegrityError:
+                        st.error(f"Error: Username '{username}' is taken or a selected subject no longer exists")
                     except sqlite3.OperationalError as e:
                         st.error("Database error: Please try again in a moment")
                         raise e
-                    finally:
-                        conn.close()
 
         elif option == "Add Subject":
             with st.form(key='add_subject_form'):
@@ -159,192 +173,319 @@ class HomeworkSystem:
                 code = st.text_input("Subject Code")
                 
                 if st.form_submit_button("Add Subject"):
-                    conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                    cursor = conn.cursor()
-                    cursor.execute("""
+                    db.execute("""
                         INSERT INTO subjects (name, code)
                         VALUES (?, ?)
                     """, (name, code))
-                    conn.commit()
-                    conn.close()
                     st.success("Subject added successfully!")
 
+        elif option == "Bulk Import":
+            import bulk_import
+            import pandas as pd
+
+            st.caption(
+                "CSV or Excel file with columns: username, name, password, role "
+                "(Student/Teacher), subjects (subject codes separated by ';'). "
+                "Rows for existing usernames with no password only add enrollments."
+            )
+            uploaded_file = st.file_uploader("Accounts file", type=["csv", "xlsx"])
+            
+            if uploaded_file is not None and st.button("Import"):
+                report = bulk_import.import_accounts(bulk_import.read_chunks(uploaded_file))
+                st.success(
+                    f"Imported {report.rows} rows in {report.seconds:.2f}s "
+                    f"({report.rows_per_second:,.0f} rows/s): {report.created} accounts created, "
+                    f"{report.enrolled} enrollments added"
+                )
+                if report.errors:
+                    st.error(f"{len(report.errors)} rows were skipped")
+                    st.dataframe(
+                        pd.DataFrame(report.errors, columns=["Row", "Error"]),
+                        hide_index=True
+                    )
+
         elif option == "Delete Account":
             account_type = st.radio("Select account type to delete", ["Student", "Teacher"])
             
-            conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, username, name FROM User
-                WHERE user_type=?
-            """, (account_type,))
-            accounts = cursor.fetchall()
-            conn.close()
+            accounts = queries.accounts_by_role(account_type)
             
             if accounts:
                 account_to_delete = st.selectbox(
                     f"Select {account_type} to delete",
-                    [f"{acc[2]} ({acc[1]})" for acc in accounts]
+                    accounts,
+                    format_func=lambda acc: f"{acc[2]} ({acc[1]})"
                 )
                 
                 if st.button("Delete Account"):
-                    account_id = accounts[[f"{acc[2]} ({acc[1]})" for acc in accounts].index(account_to_delete)][0]
-                    conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM User WHERE id=?", (account_id,))
-                    conn.commit()
-                    conn.close()
-                    st.success("Account deleted successfully!")
+                    try:
+                        db.execute("DELETE FROM User WHERE id=?", (account_to_delete[0],))
+                        st.success("Account deleted successfully!")
+                    except sqlite3.IntegrityError:
+                        st.error("Error: This account is still referenced by other records and cannot be deleted")
             else:
                 st.warning(f"No {account_type}s found")
 
         elif option == "Delete Subject":
-            conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM subjects")
-            subjects = cursor.fetchall()
-            conn.close()
+            subjects = queries.list_subjects()
             
             if subjects:
                 subject_to_delete = st.selectbox(
                     "Select subject to delete",
-                    [subject[1] for subject in subjects]
+                    subjects,
+                    format_func=lambda subject: f"{subject[2]} ({subject[1]})"
                 )
                 
                 if st.button("Delete Subject"):
-                    conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM subjects WHERE name=?", (subject_to_delete,))
-                    conn.commit()
-                    conn.close()
+                    db.execute("DELETE FROM subjects WHERE id=?", (subject_to_delete[0],))
                     st.success("Subject deleted successfully!")
             else:
                 st.warning("No subjects found")
 
+        elif option == "Analytics":
+            import gradebook
+
+            subjects = gradebook.subject_completion()
+            
+            if not subjects.empty:
+                st.dataframe(
+                    subjects,
+                    column_config=PERCENT_COLUMNS,
+                    hide_index=True
+                )
+            else:
+                st.warning("No subjects found")
+
+        elif option == "Export Grades":
+            subject = st.selectbox(
+                "Subject",
+                [None, *queries.list_subjects()],
+                format_func=lambda s: "All subjects" if s is None else f"{s[2]} ({s[1]})"
+            )
+            self.export_controls(subject and subject[0], subject[1] if subject else "all")
+
+        elif option == "Archive Term":
+            self.archive_term()
+
+        elif option == "Performance":
+            self.performance_panel()
+
         if st.button("Logout"):
             st.session_state.logged_in = False
             st.session_state.user_type = None
             st.session_state.username = None
+            st.session_state.user = None
             st.rerun()
 
     def teacher_page(self):
         st.title(f"Welcome Teacher: {st.session_state.username}")
         
-        conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT s.name 
-            FROM subjects s
-            JOIN user_subjects us ON s.id = us.subject_id
-            JOIN User u ON us.user_id = u.id
-            WHERE u.username = ?
-        """, (st.session_state.username,))
-        subjects = cursor.fetchall()
-        conn.close()
+        subjects = queries.user_subjects(st.session_state.user.id)
 
         if subjects:
-            selected_subject = st.selectbox("Select Subject", [s[0] for s in subjects])
-            action = st.radio("Select Action", ["Add Assignment", "Grade Assignment"])
+            selected_subject = st.selectbox("Select Subject", subjects, format_func=lambda s: s[1])
+            subject_id = selected_subject[0]
+            action = st.radio("Select Action", [
+                "Add Assignment", "Grade Assignment", "Batch Grade", "Grade by Answer", "Gradebook",
+                "Search", "Export Grades"
+            ])
 
             if action == "Add Assignment":
-                with st.form(key='add_assignment_form'):
-                    question_number = st.number_input("Question Number", min_value=1, step=1)
-                    question_text = st.text_area("Question")
-                    send_to = st.radio("Send to", ["Single Student", "All Students"])
+                import bulk_import
+                import pandas as pd
+
+                send_to = st.radio("Send to", ["Single Student", "All Students"])
+                student_ids = None
+                
+                if send_to == "Single Student":
+                    students = queries.subject_roster(subject_id)
                     
-                    if send_to == "Single Student":
-                        conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            SELECT DISTINCT u.id, u.name 
-                            FROM User u
-                            JOIN user_subjects us ON u.id = us.user_id
-                            JOIN subjects s ON us.subject_id = s.id
-                            WHERE u.user_type = 'Student' 
-                            AND s.name = ?
-                        """, (selected_subject,))
-                        students = cursor.fetchall()
-                        conn.close()
-                        
-                        selected_student = st.selectbox(
-                            "Select Student",
-                            [student[1] for student in students]
+                    selected_student = st.selectbox(
+                        "Select Student",
+                        students,
+                        format_func=lambda student: student[1]
+                    )
+                    student_ids = [selected_student[0]] if selected_student else []
+                
+                uploaded_file = st.file_uploader(
+                    "Upload questions (CSV or Excel with question_number, question_text columns)",
+                    type=["csv", "xlsx"]
+                )
+                if uploaded_file is not None:
+                    questions, errors = bulk_import.read_questions(uploaded_file)
+                    if errors:
+                        st.error(f"{len(errors)} rows were skipped")
+                        st.dataframe(
+                            pd.DataFrame(errors, columns=["Row", "Error"]),
+                            hide_index=True
                         )
-                    
-                    if st.form_submit_button("Add Assignment"):
-                        conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            INSERT INTO assignments (subject_id, question_number, question_text)
-                            SELECT id, ?, ? FROM subjects WHERE name = ?
-                        """, (question_number, question_text, selected_subject))
-                        
-                        assignment_id = cursor.lastrowid
-                        
-                        if send_to == "Single Student":
-                            student_id = students[[s[1] for s in students].index(selected_student)][0]
-                            cursor.execute("""
-                                INSERT INTO AssignmentStudent (student_id, assignment_id)
-                                VALUES (?, ?)
-                            """, (student_id, assignment_id))
-                        else:
-                            cursor.execute("""
-                                INSERT INTO AssignmentStudent (student_id, assignment_id)
-                                SELECT DISTINCT u.id, ?
-                                FROM User u
-                                JOIN user_subjects us ON u.id = us.user_id
-                                JOIN subjects s ON us.subject_id = s.id
-                                WHERE u.user_type = 'Student'
-                                AND s.name = ?
-                            """, (assignment_id, selected_subject))
-                        
-                        conn.commit()
-                        conn.close()
-                        st.success("Assignment added successfully!")
+                    st.dataframe(questions, hide_index=True)
+                else:
+                    numbers = queries.subject_question_numbers(subject_id)
+                    next_number = numbers[-1][0] + 1 if numbers else 1
+                    questions = st.data_editor(
+                        pd.DataFrame({"question_number": [next_number], "question_text": [""]}),
+                        column_config={
+                            "question_number": st.column_config.NumberColumn(
+                                "Question Number", min_value=1, step=1, required=True
+                            ),
+                            "question_text": st.column_config.TextColumn("Question", required=True),
+                        },
+                        num_rows="dynamic",
+                        hide_index=True,
+                        key=f"new_questions_{subject_id}"
+                    )
+                
+                questions = questions.dropna()
+                questions = questions[questions["question_text"].str.strip() != ""]
+                
+                if st.button(f"Add {len(questions)} Assignments", disabled=questions.empty):
+                    count = queries.create_assignments(
+                        subject_id,
+                        [(int(q.question_number), q.question_text.strip())
+                         for q in questions.itertuples(index=False)],
+                        student_ids
+                    )
+                    st.success(f"{len(questions)} assignments added for {count} students!")
 
             elif action == "Grade Assignment":
-                conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT DISTINCT u.name, sa.id, a.question_number, sa.answer
-                    FROM AssignmentStudent sa
-                    JOIN assignments a ON sa.assignment_id = a.id
-                    JOIN subjects s ON a.subject_id = s.id
-                    JOIN User u ON sa.student_id = u.id
-                    WHERE s.name = ? AND sa.grade IS NULL
-                """, (selected_subject,))
-                pending_assignments = cursor.fetchall()
-                conn.close()
+                queued = self.queued_writes('grades')
+                pending_assignments = [
+                    a for a in self.grading_queue(subject_id, GRADING_PAGE_SIZE) if a[0] not in queued
+                ]
 
                 if pending_assignments:
-                    selected_assignment = st.selectbox(
+                    assignment_data = st.selectbox(
                         "Select Assignment to Grade",
-                        [f"Student: {a[0]} - Question: {a[2]}" for a in pending_assignments]
+                        pending_assignments,
+                        format_func=lambda a: f"Student: {a[2]} - Question: {a[3]}"
                     )
                     
-                    assignment_index = [f"Student: {a[0]} - Question: {a[2]}" for a in pending_assignments].index(selected_assignment)
-                    assignment_data = pending_assignments[assignment_index]
-                    
-                    st.write(f"Answer: {assignment_data[3]}")
+                    st.write(f"Answer: {assignment_data[4]}")
                     
                     with st.form(key='grade_assignment_form'):
                         grade = st.selectbox("Grade", [0, 1, 2])
                         feedback = st.text_area("Feedback (optional)")
                         
                         if st.form_submit_button("Submit Grade"):
-                            conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                            cursor = conn.cursor()
-                            cursor.execute("""
-                                UPDATE AssignmentStudent
-                                SET grade = ?, feedback = ?
-                                WHERE id = ?
-                            """, (grade, feedback if feedback else None, assignment_data[1]))
-                            conn.commit()
-                            conn.close()
+                            queued[assignment_data[0]] = write_queue.get_write_queue().submit_grade(
+                                assignment_data[0], grade, feedback if feedback else None
+                            )
                             st.success("Grade submitted successfully!")
                             st.rerun()
                 else:
                     st.info("No assignments pending for grading")
+
+            elif action == "Batch Grade":
+                import pandas as pd
+
+                pending_assignments = self.grading_queue(subject_id, BATCH_GRADING_PAGE_SIZE)
+
+                if pending_assignments:
+                    edited = st.data_editor(
+                        pd.DataFrame(
+                            [(a[0], a[2], a[3], a[4], None, "") for a in pending_assignments],
+                            columns=["id", "Student", "Question", "Answer", "Grade", "Feedback"]
+                        ),
+                        column_config={
+                            "id": None,
+                            "Grade": st.column_config.SelectboxColumn("Grade", options=[0, 1, 2]),
+                            "Feedback": st.column_config.TextColumn("Feedback (optional)"),
+                        },
+                        disabled=["Student", "Question", "Answer"],
+                        hide_index=True,
+                        # A new page (or a page after saving) gets a fresh editor.
+                        key=f"batch_grade_{pending_assignments[0][0]}_{pending_assignments[-1][0]}"
+                    )
+                    graded = edited[edited["Grade"].notna()]
+                    
+                    if st.button(f"Save {len(graded)} Grades", disabled=graded.empty):
+                        queries.save_grades(
+                            (int(row.Grade), row.Feedback or None, int(row.id))
+                            for row in graded.itertuples(index=False)
+                        )
+                        st.success(f"{len(graded)} grades saved")
+                        st.rerun()
+                else:
+                    st.info("No assignments pending for grading")
+
+            elif action == "Grade by Answer":
+                import answer_groups
+
+                assignments = queries.subject_assignments(subject_id)
+                
+                if assignments:
+                    assignment = st.selectbox(
+                        "Select Question",
+                        assignments,
+                        format_func=lambda a: f"Question {a[1]}: {a[2][:80]}"
+                    )
+                    merge_similar = st.checkbox("Also merge similar answers")
+                    similarity = st.slider(
+                        "Similarity threshold", 0.7, 1.0, 0.9, 0.05
+                    ) if merge_similar else None
+                    
+                    try:
+                        answers = answer_groups.assignment_groups(assignment[0], similarity)
+                    except ValueError as e:
+                        st.warning(f"{e}; grouping identical answers only")
+                        answers = answer_groups.assignment_groups(assignment[0])
+                    
+                    if not answers.empty:
+                        # Each group's leader rows come first.
+                        groups = answers.groupby("group", sort=True).agg(
+                            size=("id", "size"), answer=("answer", "first")
+                        )
+                        st.caption(f"{len(answers)} ungraded answers in {len(groups)} groups")
+                        group = st.selectbox(
+                            "Select Answer Group",
+                            groups.index,
+                            format_func=lambda g: f"{groups.at[g, 'size']} x {str(groups.at[g, 'answer'])[:80]}"
+                        )
+                        members = answers[answers["group"] == group]
+                        st.dataframe(members[["student", "answer"]], hide_index=True)
+                        
+                        with st.form(key='grade_group_form'):
+                            grade = st.selectbox("Grade", [0, 1, 2])
+                            feedback = st.text_area("Feedback (optional)")
+                            
+                            if st.form_submit_button(f"Grade {len(members)} Answers"):
+                                queries.save_grades(
+                                    (grade, feedback if feedback else None, int(answer_id))
+                                    for answer_id in members["id"]
+                                )
+                                st.success(f"{len(members)} answers graded")
+                                st.rerun()
+                    else:
+                        st.info("No answers pending for grading")
+                else:
+                    st.info("No assignments for this subject yet")
+
+            elif action == "Gradebook":
+                import gradebook
+
+                students = gradebook.student_totals(subject_id)
+                
+                if not students.empty:
+                    questions = gradebook.question_distribution(subject_id)
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Students", len(students))
+                    col2.metric("Completion", f"{students['Answered'].sum() / students['Assigned'].sum():.0%}")
+                    col3.metric("Graded", f"{students['Graded'].sum()} / {students['Answered'].sum()}")
+                    
+                    st.subheader("Students")
+                    st.dataframe(students, column_config=PERCENT_COLUMNS, hide_index=True)
+                    
+                    st.subheader("Grade Distribution per Question")
+                    st.bar_chart(questions[["0", "1", "2"]], x_label="Question", y_label="Answers")
+                    st.dataframe(questions, column_config=PERCENT_COLUMNS)
+                else:
+                    st.info("No assignments for this subject yet")
+
+            elif action == "Search":
+                self.search(subject_id)
+
+            elif action == "Export Grades":
+                self.export_controls(subject_id, selected_subject[1])
         else:
             st.warning("No subjects assigned to you. Please contact admin to assign subjects.")
 
@@ -352,40 +493,219 @@ class HomeworkSystem:
             st.session_state.logged_in = False
             st.session_state.user_type = None
             st.session_state.username = None
+            st.session_state.user = None
             st.rerun()
 
+    def grading_queue(self, subject_id, page_size):
+        """Show filters and paging for the subject's ungraded answers and
+        return the rows of the current page."""
+        students = queries.subject_roster(subject_id)
+        col1, col2 = st.columns(2)
+        student = col1.selectbox(
+            "Student", [None, *students],
+            format_func=lambda s: "All students" if s is None else s[1]
+        )
+        question_number = col2.selectbox(
+            "Question", [None, *queries.subject_question_numbers(subject_id)],
+            format_func=lambda q: "All questions" if q is None else f"Question {q[0]}"
+        )
+        filters = (subject_id, student and student[0], question_number and question_number[0],
+                   page_size)
+
+        # Keyset cursors for every page visited so far; the last one is the
+        # start of the current page. Changing subject, filters or page size
+        # (i.e. switching grading view) starts over.
+        if st.session_state.get('grading_filters') != filters:
+            st.session_state.grading_filters = filters
+            st.session_state.grading_cursors = [queries.GRADING_QUEUE_START]
+        cursors = st.session_state.grading_cursors
+
+        rows = queries.grading_queue_page(
+            subject_id, cursors[-1], page_size + 1,
+            student_id=filters[1], question_number=filters[2]
+        )
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if not rows:
+            if len(cursors) > 1:
+                # Everything on this page was graded; step back a page.
+                cursors.pop()
+                st.rerun()
+            return rows
+
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        page_col.caption(f"Page {len(cursors)}")
+        if next_col.button("Next", disabled=not has_next):
+            cursors.append((rows[-1][1], rows[-1][0]))
+            st.rerun()
+
+        return rows
+
+    def search(self, subject_id):
+        import pandas as pd
+
+        scope = st.radio("Search in", ["Answers", "Questions"], horizontal=True)
+        text = st.text_input("Search for", placeholder="Words to look for, in any order")
+        if not text.strip():
+            return
+
+        # Ranked results are paged by offset; a new search starts over.
+        search = (subject_id, scope, text)
+        if st.session_state.get('search') != search:
+            st.session_state.search = search
+            st.session_state.search_page = 0
+        page = st.session_state.search_page
+
+        if scope == "Answers":
+            rows = queries.search_answers(subject_id, text, page * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE + 1)
+            columns = ["id", "Student", "Question", "Answer", "Grade"]
+        else:
+            rows = queries.search_questions(subject_id, text, page * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE + 1)
+            columns = ["id", "Question", "Text", "Answered", "Graded"]
+        has_next = len(rows) > SEARCH_PAGE_SIZE
+        rows = rows[:SEARCH_PAGE_SIZE]
+
+        if not rows:
+            st.info("No matches found")
+            return
+
+        st.dataframe(
+            pd.DataFrame(rows, columns=columns),
+            column_config={"id": None},
+            hide_index=True
+        )
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("Previous", disabled=page == 0):
+            st.session_state.search_page -= 1
+            st.rerun()
+        page_col.caption(f"Page {page + 1}")
+        if next_col.button("Next", disabled=not has_next):
+            st.session_state.search_page += 1
+            st.rerun()
+
+    def export_controls(self, subject_id, label):
+        formats = ["CSV", "Parquet"] if export.parquet_available() else ["CSV"]
+        fmt = st.radio("Format", formats, horizontal=True)
+        _, extension, mimetype = export.FORMATS[fmt]
+        # The export is only generated when the button is clicked. Rows are
+        # streamed in chunks into a spooled temporary file that Streamlit
+        # reads once, so only the encoded file it serves is ever held whole.
+        st.download_button(
+            f"Download {fmt}",
+            data=lambda: export.export(fmt, subject_id),
+            file_name=f"grades_{label}_{datetime.now():%Y%m%d}.{extension}",
+            mime=mimetype
+        )
+
+    def archive_term(self):
+        import pandas as pd
+
+        st.caption(
+            "Moves fully graded assignments and their answers into the archive database, "
+            "where they stay available read-only."
+        )
+        before = st.date_input("Archive work assigned before", value=None)
+        if before:
+            candidates = archive.archivable(before.isoformat())
+            rows = sum(count for _, count in candidates)
+            st.write(f"{len(candidates)} assignments with {rows} student rows can be archived.")
+
+            if st.button("Archive", disabled=not candidates):
+                progress = st.progress(0.0, text="Archiving...")
+                for step in archive.archive_term(before.isoformat()):
+                    progress.progress(
+                        step.rows / step.total_rows if step.total_rows else 1.0,
+                        text=f"{step.assignments} assignments, {step.rows} rows moved"
+                    )
+                st.success("Archive complete")
+
+        archived = archive.archived_subjects()
+        if archived:
+            st.subheader("Archived")
+            st.dataframe(
+                pd.DataFrame(archived, columns=[
+                    "Code", "Subject", "Assignments", "Answers", "Graded", "Average",
+                    "First Assigned", "Last Assigned"
+                ]),
+                hide_index=True
+            )
+
+    def performance_panel(self):
+        import pandas as pd
+
+        st.caption("Timings since this server process started or was last reset.")
+
+        st.subheader("Page reruns")
+        pages = pd.DataFrame(metrics.metrics.page_stats())
+        if not pages.empty:
+            st.dataframe(pages.drop(columns="rows"), hide_index=True)
+        else:
+            st.info("No page reruns recorded yet")
+
+        st.subheader("Queries")
+        query_stats = pd.DataFrame(metrics.metrics.query_stats())
+        if not query_stats.empty:
+            st.dataframe(query_stats, hide_index=True)
+            selected = st.selectbox("Latency histogram for", query_stats["query"])
+            st.bar_chart(pd.Series(
+                metrics.metrics.query_buckets(selected),
+                index=pd.Index(metrics.bucket_labels(), name="elapsed"), name="calls"
+            ), sort=False)
+        else:
+            st.info("No queries recorded yet")
+        if metrics.SLOW_QUERY_LOG:
+            st.caption(f"Queries over {metrics.SLOW_QUERY_MS:g}ms are logged to {metrics.SLOW_QUERY_LOG}")
+
+        count, p50, p95 = auth.verification_stats()
+        write_stats = write_queue.get_write_queue().stats()
+        login_col, queue_col, cache_col = st.columns(3)
+        login_col.metric("Logins verified", count)
+        login_col.caption(f"p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms")
+        queue_col.metric("Write queue depth", write_stats['depth'])
+        queue_col.caption(
+            f"{write_stats['writes']} writes in {write_stats['batches']} batches, "
+            f"mean {write_stats['mean_batch']:.1f}, max {write_stats['max_batch']}"
+        )
+        cache_col.metric("Query cache hits", query_cache.hits)
+        cache_col.caption(f"{query_cache.misses} misses, {len(query_cache)} entries")
+
+        if st.button("Reset timings"):
+            metrics.metrics.reset()
+            st.rerun()
+
+    def queued_writes(self, kind):
+        """This session's queued writes of ``kind`` that are not committed
+        yet, keyed by the id they write to; failed writes are reported."""
+        queued = st.session_state.setdefault(f'queued_{kind}', {})
+        for key, future in list(queued.items()):
+            if future.done():
+                del queued[key]
+                if isinstance(future.exception(), LookupError):
+                    st.error("Error: a submission could not be saved, the assignment no longer exists")
+                elif future.exception() is not None:
+                    st.error("Database error: a submission could not be saved, please try again")
+        return queued
+
     def student_page(self):
         st.title(f"Welcome Student: {st.session_state.username}")
         
-        conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT s.name 
-            FROM subjects s
-            JOIN user_subjects us ON s.id = us.subject_id
-            JOIN User u ON us.user_id = u.id
-            WHERE u.username = ?
-        """, (st.session_state.username,))
-        subjects = cursor.fetchall()
-        conn.close()
+        subjects = queries.user_subjects(st.session_state.user.id)
 
         if subjects:
-            selected_subject = st.selectbox("Select Subject", [s[0] for s in subjects])
+            selected_subject = st.selectbox("Select Subject", subjects, format_func=lambda s: s[1])
+            subject_id = selected_subject[0]
             action = st.radio("Select Action", ["Do Homework", "View Grades"])
 
             if action == "Do Homework":
-                conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT a.id, a.question_number, a.question_text
-                    FROM assignments a
-                    JOIN subjects s ON a.subject_id = s.id
-                    JOIN AssignmentStudent sa ON a.id = sa.assignment_id
-                    JOIN User u ON sa.student_id = u.id
-                    WHERE s.name = ? AND u.username = ? AND sa.answer IS NULL
-                """, (selected_subject, st.session_state.username))
-                pending_assignments = cursor.fetchall()
-                conn.close()
+                queued = self.queued_writes('answers')
+                pending_assignments = [
+                    a for a in queries.pending_homework(subject_id, st.session_state.user.id)
+                    if a[0] not in queued
+                ]
 
                 if pending_assignments:
                     selected_question = st.selectbox(
@@ -402,47 +722,75 @@ class HomeworkSystem:
                         answer = st.text_area("Your Answer")
                         
                         if st.form_submit_button("Submit Answer"):
-                            conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                            cursor = conn.cursor()
-                            cursor.execute("""
-                                UPDATE AssignmentStudent
-                                SET answer = ?
-                                WHERE assignment_id = ? AND student_id = (
-                                    SELECT id FROM User WHERE username = ?
-                                )
-                            """, (answer, question_data[0], st.session_state.username))
-                            conn.commit()
-                            conn.close()
+                            queued[question_data[0]] = write_queue.get_write_queue().submit_answer(
+                                question_data[0], st.session_state.user.id, answer
+                            )
                             st.success("Answer submitted successfully!")
                             st.rerun()
                 else:
                     st.info("No pending assignments")
 
             elif action == "View Grades":
-                conn = sqlite3.connect('HomeworkEvaluationSystem.db')
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT a.question_number, sa.grade, sa.feedback
-                    FROM AssignmentStudent sa
-                    JOIN assignments a ON sa.assignment_id = a.id
-                    JOIN subjects s ON a.subject_id = s.id
-                    JOIN User u ON sa.student_id = u.id
-                    WHERE s.name = ? AND u.username = ? AND sa.grade IS NOT NULL
-                """, (selected_subject, st.session_state.username))
-                graded_assignments = cursor.fetchall()
-                conn.close()
-
-                if graded_assignments:
-                    for assignment in graded_assignments:
-                        st.write(f"Question {assignment[0]}")
-                        st.write(f"Grade: {assignment[1]}/2")
-                        if assignment[2]:
-                            st.write(f"Feedback: {assignment[2]}")
-                        else:
-                            st.write("No feedback provided")
-                        st.write("---")
+                import pandas as pd
+
+                student_id = st.session_state.user.id
+                graded_count = queries.graded_count(subject_id, student_id)
+
+                if graded_count:
+                    # Keyset cursors (assignment ids) for every page visited.
+                    if st.session_state.get('grades_subject') != subject_id:
+                        st.session_state.grades_subject = subject_id
+                        st.session_state.grades_cursors = [0]
+                    cursors = st.session_state.grades_cursors
+                    
+                    graded_assignments = queries.graded_homework_page(
+                        subject_id, student_id, cursors[-1], GRADES_PAGE_SIZE + 1
+                    )
+                    has_next = len(graded_assignments) > GRADES_PAGE_SIZE
+                    graded_assignments = graded_assignments[:GRADES_PAGE_SIZE]
+                    
+                    st.dataframe(
+                        pd.DataFrame(
+                            [(a[1], f"{a[2]}/2", "Yes" if a[3] else "No") for a in graded_assignments],
+                            columns=["Question", "Grade", "Feedback"]
+                        ),
+                        hide_index=True
+                    )
+                    
+                    prev_col, page_col, next_col = st.columns([1, 2, 1])
+                    if prev_col.button("Previous", disabled=len(cursors) == 1):
+                        cursors.pop()
+                        st.rerun()
+                    page_col.caption(
+                        f"Page {len(cursors)} of {-(-graded_count // GRADES_PAGE_SIZE)} "
+                        f"({graded_count} graded)"
+                    )
+                    if next_col.button("Next", disabled=not has_next):
+                        cursors.append(graded_assignments[-1][0])
+                        st.rerun()
+                    
+                    # Feedback text is only fetched for the question picked here.
+                    with_feedback = [a for a in graded_assignments if a[3]]
+                    if with_feedback:
+                        selected = st.selectbox(
+                            "Show feedback for",
+                            [None, *with_feedback],
+                            format_func=lambda a: "-" if a is None else f"Question {a[1]}"
+                        )
+                        if selected:
+                            st.info(queries.feedback(selected[0], student_id))
                 else:
                     st.info("No graded assignments yet")
+
+                if st.checkbox("Show earlier terms"):
+                    history = archive.student_history(student_id, subject_id)
+                    if history:
+                        st.dataframe(
+                            pd.DataFrame(history, columns=["Assigned", "Question", "Answer", "Grade", "Feedback"]),
+                            hide_index=True
+                        )
+                    else:
+                        st.info("No archived work for this subject")
         else:
             st.warning("No subjects assigned to you. Please contact admin to assign subjects.")
 
@@ -450,6 +798,7 @@ class HomeworkSystem:
             st.session_state.logged_in = False
             st.session_state.user_type = None
             st.session_state.username = None
+            st.session_state.user = None
             st.rerun()
 
 if __name__ == "__main__":
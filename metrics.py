@@ -0,0 +1,146 @@
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Timings kept per query fingerprint and per page for percentiles.
+WINDOW = 1000
+# Upper bounds (seconds) of the histogram buckets; the last bucket is open.
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+SLOW_QUERY_LOG = os.environ.get('HOMEWORK_SLOW_QUERY_LOG')
+SLOW_QUERY_MS = float(os.environ.get('HOMEWORK_SLOW_QUERY_MS', '100'))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+slow_log = logging.getLogger('homework.slow_queries')
+if SLOW_QUERY_LOG:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG, encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_log.addHandler(_handler)
+    slow_log.setLevel(logging.INFO)
+    slow_log.propagate = False
+
+# Page and role of the rerun running on this thread; Streamlit runs each
+# session's script on its own thread.
+_context = threading.local()
+
+
+def fingerprint(sql):
+    """``sql`` with literals replaced by ``?``, placeholder lists collapsed
+    and whitespace normalized, so calls differing only in values group."""
+    text = " ".join(_LITERALS.sub("?", sql).split())
+    return _PLACEHOLDER_LISTS.sub("(?, ...)", text)
+
+
+class Histogram:
+    """Call count and total time since reset, plus the latest ``WINDOW``
+    timings for percentiles and bucket counts."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.rows = 0
+        self.timings = deque(maxlen=WINDOW)
+
+    def add(self, elapsed, rows=0):
+        self.calls += 1
+        self.total += elapsed
+        self.rows += rows
+        self.timings.append(elapsed)
+
+    def percentile(self, fraction):
+        timings = sorted(self.timings)
+        if not timings:
+            return 0.0
+        return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+    def buckets(self):
+        counts = [0] * (len(BUCKETS) + 1)
+        for elapsed in self.timings:
+            counts[bisect_left(BUCKETS, elapsed)] += 1
+        return counts
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'rows': self.rows / self.calls if self.calls else 0.0,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'max_ms': max(self.timings, default=0.0) * 1000,
+            'total_ms': self.total * 1000,
+        }
+
+
+class Metrics:
+    """In-process timings of database calls and page reruns."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queries = {}
+            self.pages = {}
+
+    def record_query(self, sql, elapsed, rows=0):
+        key = fingerprint(sql)
+        page = getattr(_context, 'page', None) or 'background'
+        role = getattr(_context, 'role', None) or ''
+        with self._lock:
+            histogram = self.queries.get(key)
+            if histogram is None:
+                histogram = self.queries[key] = Histogram()
+            histogram.add(elapsed, rows)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_log.info("%.1fms rows=%d page=%s role=%s %s",
+                          elapsed * 1000, rows, page, role, key)
+
+    def record_page(self, page, role, elapsed):
+        with self._lock:
+            histogram = self.pages.get((page, role))
+            if histogram is None:
+                histogram = self.pages[(page, role)] = Histogram()
+            histogram.add(elapsed)
+
+    def query_stats(self):
+        """One dict per query fingerprint, slowest total time first."""
+        with self._lock:
+            rows = [{'query': key, **histogram.summary()}
+                    for key, histogram in self.queries.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def page_stats(self):
+        with self._lock:
+            return [{'page': page, 'role': role, **histogram.summary()}
+                    for (page, role), histogram in self.pages.items()]
+
+    def query_buckets(self, key):
+        with self._lock:
+            histogram = self.queries.get(key)
+            return histogram.buckets() if histogram else [0] * (len(BUCKETS) + 1)
+
+
+metrics = Metrics()
+
+
+def bucket_labels():
+    bounds = [f"<{bound * 1000:g}ms" for bound in BUCKETS]
+    return bounds + [f">={BUCKETS[-1] * 1000:g}ms"]
+
+
+@contextmanager
+def page(name, role):
+    """Time a page rerun and tag the queries it runs with ``name``/``role``."""
+    _context.page, _context.role = name, role
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record_page(name, role, time.perf_counter() - start)
+        _context.page = _context.role = None
@@ -0,0 +1,527 @@
+import threading
+
+import auth
+import db
+
+
+def _table_exists(conn, name, kind='table'):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+    ).fetchone() is not None
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# Tables of the first schema that nothing reads any more, children first.
+LEGACY_TABLES = (
+    'Evaluation', 'StudentAnswer', 'Question', 'Assignment',
+    'TeacherCourse', 'StudentCourse', 'Admin', 'Teacher', 'Student', 'Course',
+)
+
+
+def _retire(conn, table):
+    # A plain copy has no constraints, so the old rows stay readable
+    # without foreign keys into User, subjects or each other.
+    conn.execute(f"CREATE TABLE {table}_legacy AS SELECT * FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+
+
+def _reconcile_legacy_tables(conn):
+    # User is the canonical account table; it gains the display name the
+    # pages show and role values are normalized to 'Admin'/'Teacher'/'Student'.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS User (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL,
+            name TEXT
+        )
+    """)
+    if 'name' not in _columns(conn, 'User'):
+        conn.execute("ALTER TABLE User ADD COLUMN name TEXT")
+
+    legacy_users = _table_exists(conn, 'users')
+    if legacy_users:
+        conn.execute("""
+            INSERT OR IGNORE INTO User (username, password, role, name)
+            SELECT username, password, user_type, name FROM users
+        """)
+    conn.execute("""
+        UPDATE User SET role = upper(substr(role, 1, 1)) || lower(substr(role, 2))
+    """)
+    for profile in ('Teacher', 'Student'):
+        if _table_exists(conn, profile):
+            conn.execute(f"""
+                UPDATE User SET name = (
+                    SELECT p.name FROM {profile} p WHERE p.user_id = User.id
+                )
+                WHERE name IS NULL
+            """)
+    conn.execute("UPDATE User SET name = username WHERE name IS NULL")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL
+        )
+    """)
+    if _table_exists(conn, 'Course'):
+        # A course keeps its id unless a subject already has it; either way
+        # it is matched to its subject by code below.
+        conn.execute("""
+            INSERT INTO subjects (id, code, name)
+            SELECT id, code, name FROM Course
+            WHERE code NOT IN (SELECT code FROM subjects)
+            AND id NOT IN (SELECT id FROM subjects)
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO subjects (code, name)
+            SELECT code, name FROM Course
+        """)
+
+    # user_subjects and assignments are rebuilt so their foreign keys point
+    # at User/subjects and cascade on delete.
+    conn.execute("""
+        CREATE TABLE user_subjects_new (
+            user_id INTEGER NOT NULL REFERENCES User(id) ON DELETE CASCADE,
+            subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+            PRIMARY KEY (user_id, subject_id)
+        )
+    """)
+    if _table_exists(conn, 'user_subjects'):
+        # The old user_subjects.user_id points at users(id); map it to User
+        # by username, as the submissions copy below does.
+        conn.execute("""
+            INSERT OR IGNORE INTO user_subjects_new (user_id, subject_id)
+            SELECT u.id, us.subject_id
+            FROM user_subjects us
+            JOIN users lu ON lu.id = us.user_id
+            JOIN User u ON u.username = lu.username
+            WHERE us.subject_id IN (SELECT id FROM subjects)
+        """)
+        conn.execute("DROP TABLE user_subjects")
+    conn.execute("ALTER TABLE user_subjects_new RENAME TO user_subjects")
+    for profile, enrollment, column in (('Teacher', 'TeacherCourse', 'teacher_id'),
+                                        ('Student', 'StudentCourse', 'student_id')):
+        if _table_exists(conn, enrollment):
+            conn.execute(f"""
+                INSERT OR IGNORE INTO user_subjects (user_id, subject_id)
+                SELECT p.user_id, s.id
+                FROM {enrollment} e
+                JOIN {profile} p ON p.id = e.{column}
+                JOIN Course c ON c.id = e.course_id
+                JOIN subjects s ON s.code = c.code
+                WHERE p.user_id IN (SELECT id FROM User)
+            """)
+
+    conn.execute("""
+        CREATE TABLE assignments_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+            question_number INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    if _table_exists(conn, 'assignments'):
+        conn.execute("""
+            INSERT INTO assignments_new (id, subject_id, question_number, question_text)
+            SELECT id, subject_id, question_number, question_text FROM assignments
+            WHERE subject_id IN (SELECT id FROM subjects)
+        """)
+        conn.execute("DROP TABLE assignments")
+    conn.execute("ALTER TABLE assignments_new RENAME TO assignments")
+
+    # The old AssignmentStudent belongs to the unused Assignment/Question
+    # model (no answers or grades); its rows are kept with the other
+    # legacy tables below.
+    if _table_exists(conn, 'AssignmentStudent') and 'id' not in _columns(conn, 'AssignmentStudent'):
+        _retire(conn, 'AssignmentStudent')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS AssignmentStudent (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            assignment_id INTEGER NOT NULL REFERENCES assignments(id) ON DELETE CASCADE,
+            student_id INTEGER NOT NULL REFERENCES User(id) ON DELETE CASCADE,
+            answer TEXT,
+            grade INTEGER CHECK (grade IN (0, 1, 2)),
+            feedback TEXT,
+            submitted_at TIMESTAMP,
+            UNIQUE (assignment_id, student_id)
+        )
+    """)
+    if _table_exists(conn, 'submissions'):
+        conn.execute("""
+            INSERT OR IGNORE INTO AssignmentStudent
+                (assignment_id, student_id, answer, grade, feedback, submitted_at)
+            SELECT s.assignment_id, u.id, s.answer, s.grade, s.feedback,
+                   CASE WHEN s.answer IS NOT NULL THEN s.submission_date END
+            FROM submissions s
+            JOIN users lu ON lu.id = s.student_id
+            JOIN User u ON u.username = lu.username
+            WHERE s.assignment_id IN (SELECT id FROM assignments)
+        """)
+        conn.execute("DROP TABLE submissions")
+        conn.execute("""
+            CREATE VIEW submissions AS
+            SELECT id, assignment_id, student_id, answer, grade, feedback,
+                   CASE WHEN grade IS NOT NULL THEN 'graded'
+                        WHEN answer IS NOT NULL THEN 'submitted'
+                        ELSE 'pending' END AS status,
+                   submitted_at AS submission_date
+            FROM AssignmentStudent
+        """)
+
+    if legacy_users:
+        conn.execute("DROP TABLE users")
+        conn.execute("""
+            CREATE VIEW users AS
+            SELECT id, username, password, role AS user_type, name FROM User
+        """)
+    for table in LEGACY_TABLES:
+        if _table_exists(conn, table):
+            _retire(conn, table)
+    if _table_exists(conn, 'Course_legacy') and not _table_exists(conn, 'Course', 'view'):
+        conn.execute("CREATE VIEW Course AS SELECT id, code, name FROM subjects")
+
+
+def _add_lookup_indexes(conn):
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_user_role_name ON User (role, name)",
+        "CREATE INDEX IF NOT EXISTS idx_subjects_name ON subjects (name)",
+        "CREATE INDEX IF NOT EXISTS idx_user_subjects_subject ON user_subjects (subject_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_assignments_subject ON assignments (subject_id, question_number)",
+        "CREATE INDEX IF NOT EXISTS idx_assignment_student_student ON AssignmentStudent (student_id, assignment_id)",
+    ):
+        conn.execute(statement)
+
+
+def _add_grading_queue_index(conn):
+    # Answers saved before submitted_at existed sort as submitted now.
+    conn.execute("""
+        UPDATE AssignmentStudent SET submitted_at = CURRENT_TIMESTAMP
+        WHERE answer IS NOT NULL AND submitted_at IS NULL
+    """)
+    # Only ungraded answers are indexed, so a grading page reads the
+    # subject's backlog past the cursor rather than every answer ever given.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_assignment_student_ungraded
+        ON AssignmentStudent (assignment_id, submitted_at, id)
+        WHERE grade IS NULL AND answer IS NOT NULL
+    """)
+
+
+def _add_grade_summaries(conn):
+    # Gradebook counters kept current by triggers on AssignmentStudent, so
+    # reports read a row per student or question instead of aggregating
+    # every answer on each rerun.
+    conn.execute("""
+        CREATE TABLE student_subject_summary (
+            subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+            student_id INTEGER NOT NULL REFERENCES User(id) ON DELETE CASCADE,
+            assigned INTEGER NOT NULL DEFAULT 0,
+            answered INTEGER NOT NULL DEFAULT 0,
+            graded INTEGER NOT NULL DEFAULT 0,
+            total_score INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (subject_id, student_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE question_summary (
+            assignment_id INTEGER PRIMARY KEY REFERENCES assignments(id) ON DELETE CASCADE,
+            assigned INTEGER NOT NULL DEFAULT 0,
+            answered INTEGER NOT NULL DEFAULT 0,
+            graded INTEGER NOT NULL DEFAULT 0,
+            score_0 INTEGER NOT NULL DEFAULT 0,
+            score_1 INTEGER NOT NULL DEFAULT 0,
+            score_2 INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        INSERT INTO student_subject_summary
+            (subject_id, student_id, assigned, answered, graded, total_score)
+        SELECT a.subject_id, sa.student_id, COUNT(*), COUNT(sa.answer),
+               COUNT(sa.grade), COALESCE(SUM(sa.grade), 0)
+        FROM AssignmentStudent sa
+        JOIN assignments a ON a.id = sa.assignment_id
+        GROUP BY a.subject_id, sa.student_id
+    """)
+    conn.execute("""
+        INSERT INTO question_summary
+            (assignment_id, assigned, answered, graded, score_0, score_1, score_2)
+        SELECT assignment_id, COUNT(*), COUNT(answer), COUNT(grade),
+               SUM(COALESCE(grade = 0, 0)), SUM(COALESCE(grade = 1, 0)), SUM(COALESCE(grade = 2, 0))
+        FROM AssignmentStudent
+        GROUP BY assignment_id
+    """)
+
+    # Each trigger applies the difference one AssignmentStudent row makes;
+    # `x IS NOT NULL` and `grade = n` evaluate to 0/1.
+    conn.execute("""
+        CREATE TRIGGER summary_after_insert AFTER INSERT ON AssignmentStudent
+        BEGIN
+            INSERT INTO student_subject_summary
+                (subject_id, student_id, assigned, answered, graded, total_score)
+            SELECT subject_id, NEW.student_id, 1, NEW.answer IS NOT NULL,
+                   NEW.grade IS NOT NULL, COALESCE(NEW.grade, 0)
+            FROM assignments WHERE id = NEW.assignment_id
+            ON CONFLICT (subject_id, student_id) DO UPDATE SET
+                assigned = assigned + 1,
+                answered = answered + excluded.answered,
+                graded = graded + excluded.graded,
+                total_score = total_score + excluded.total_score;
+            INSERT INTO question_summary
+                (assignment_id, assigned, answered, graded, score_0, score_1, score_2)
+            VALUES (NEW.assignment_id, 1, NEW.answer IS NOT NULL, NEW.grade IS NOT NULL,
+                    COALESCE(NEW.grade = 0, 0), COALESCE(NEW.grade = 1, 0),
+                    COALESCE(NEW.grade = 2, 0))
+            ON CONFLICT (assignment_id) DO UPDATE SET
+                assigned = assigned + 1,
+                answered = answered + excluded.answered,
+                graded = graded + excluded.graded,
+                score_0 = score_0 + excluded.score_0,
+                score_1 = score_1 + excluded.score_1,
+                score_2 = score_2 + excluded.score_2;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER summary_after_update AFTER UPDATE OF answer, grade ON AssignmentStudent
+        BEGIN
+            UPDATE student_subject_summary SET
+                answered = answered + (NEW.answer IS NOT NULL) - (OLD.answer IS NOT NULL),
+                graded = graded + (NEW.grade IS NOT NULL) - (OLD.grade IS NOT NULL),
+                total_score = total_score + COALESCE(NEW.grade, 0) - COALESCE(OLD.grade, 0)
+            WHERE subject_id = (SELECT subject_id FROM assignments WHERE id = NEW.assignment_id)
+            AND student_id = NEW.student_id;
+            UPDATE question_summary SET
+                answered = answered + (NEW.answer IS NOT NULL) - (OLD.answer IS NOT NULL),
+                graded = graded + (NEW.grade IS NOT NULL) - (OLD.grade IS NOT NULL),
+                score_0 = score_0 + COALESCE(NEW.grade = 0, 0) - COALESCE(OLD.grade = 0, 0),
+                score_1 = score_1 + COALESCE(NEW.grade = 1, 0) - COALESCE(OLD.grade = 1, 0),
+                score_2 = score_2 + COALESCE(NEW.grade = 2, 0) - COALESCE(OLD.grade = 2, 0)
+            WHERE assignment_id = NEW.assignment_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER summary_after_delete AFTER DELETE ON AssignmentStudent
+        BEGIN
+            UPDATE student_subject_summary SET
+                assigned = assigned - 1,
+                answered = answered - (OLD.answer IS NOT NULL),
+                graded = graded - (OLD.grade IS NOT NULL),
+                total_score = total_score - COALESCE(OLD.grade, 0)
+            WHERE subject_id = (SELECT subject_id FROM assignments WHERE id = OLD.assignment_id)
+            AND student_id = OLD.student_id;
+            UPDATE question_summary SET
+                assigned = assigned - 1,
+                answered = answered - (OLD.answer IS NOT NULL),
+                graded = graded - (OLD.grade IS NOT NULL),
+                score_0 = score_0 - COALESCE(OLD.grade = 0, 0),
+                score_1 = score_1 - COALESCE(OLD.grade = 1, 0),
+                score_2 = score_2 - COALESCE(OLD.grade = 2, 0)
+            WHERE assignment_id = OLD.assignment_id;
+        END
+    """)
+    # Deleting an assignment cascades to its AssignmentStudent rows after the
+    # assignment is gone, when summary_after_delete can no longer find the
+    # subject; take the rows out of the student totals beforehand instead.
+    conn.execute("""
+        CREATE TRIGGER summary_before_assignment_delete BEFORE DELETE ON assignments
+        BEGIN
+            UPDATE student_subject_summary SET
+                assigned = assigned - 1,
+                answered = answered - (
+                    SELECT answer IS NOT NULL FROM AssignmentStudent
+                    WHERE assignment_id = OLD.id AND student_id = student_subject_summary.student_id
+                ),
+                graded = graded - (
+                    SELECT grade IS NOT NULL FROM AssignmentStudent
+                    WHERE assignment_id = OLD.id AND student_id = student_subject_summary.student_id
+                ),
+                total_score = total_score - (
+                    SELECT COALESCE(grade, 0) FROM AssignmentStudent
+                    WHERE assignment_id = OLD.id AND student_id = student_subject_summary.student_id
+                )
+            WHERE subject_id = OLD.subject_id
+            AND student_id IN (SELECT student_id FROM AssignmentStudent WHERE assignment_id = OLD.id);
+        END
+    """)
+
+
+def _add_search_indexes(conn):
+    # External-content FTS5 indexes: the text lives only in assignments and
+    # AssignmentStudent. subject_id is indexed too (as a token) so a search
+    # can be narrowed to one subject inside the index; the rank setting
+    # gives it no weight in bm25.
+    conn.execute("""
+        CREATE VIRTUAL TABLE question_search USING fts5(
+            question_text, subject_id,
+            content='assignments', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute("""
+        CREATE VIEW answer_search_content AS
+        SELECT sa.id, sa.answer, a.subject_id
+        FROM AssignmentStudent sa
+        JOIN assignments a ON a.id = sa.assignment_id
+        WHERE sa.answer IS NOT NULL
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE answer_search USING fts5(
+            answer, subject_id,
+            content='answer_search_content', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+    """)
+    for table in ('question_search', 'answer_search'):
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {table} ({table}, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+
+    # FTS5 'delete' must be given exactly the values that were indexed.
+    conn.execute("""
+        CREATE TRIGGER question_search_after_insert AFTER INSERT ON assignments
+        BEGIN
+            INSERT INTO question_search (rowid, question_text, subject_id)
+            VALUES (NEW.id, NEW.question_text, NEW.subject_id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER question_search_after_update
+        AFTER UPDATE OF question_text, subject_id ON assignments
+        BEGIN
+            INSERT INTO question_search (question_search, rowid, question_text, subject_id)
+            VALUES ('delete', OLD.id, OLD.question_text, OLD.subject_id);
+            INSERT INTO question_search (rowid, question_text, subject_id)
+            VALUES (NEW.id, NEW.question_text, NEW.subject_id);
+        END
+    """)
+    # Also drops the assignment's answers: its AssignmentStudent rows are
+    # cascade-deleted after the assignment is gone, when
+    # answer_search_after_delete can no longer find their subject.
+    conn.execute("""
+        CREATE TRIGGER search_before_assignment_delete BEFORE DELETE ON assignments
+        BEGIN
+            INSERT INTO question_search (question_search, rowid, question_text, subject_id)
+            VALUES ('delete', OLD.id, OLD.question_text, OLD.subject_id);
+            INSERT INTO answer_search (answer_search, rowid, answer, subject_id)
+            SELECT 'delete', id, answer, OLD.subject_id FROM AssignmentStudent
+            WHERE assignment_id = OLD.id AND answer IS NOT NULL;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER answer_search_after_insert AFTER INSERT ON AssignmentStudent
+        WHEN NEW.answer IS NOT NULL
+        BEGIN
+            INSERT INTO answer_search (rowid, answer, subject_id)
+            SELECT NEW.id, NEW.answer, subject_id FROM assignments WHERE id = NEW.assignment_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER answer_search_after_update AFTER UPDATE OF answer ON AssignmentStudent
+        WHEN OLD.answer IS NOT NEW.answer
+        BEGIN
+            INSERT INTO answer_search (answer_search, rowid, answer, subject_id)
+            SELECT 'delete', OLD.id, OLD.answer, subject_id FROM assignments
+            WHERE id = OLD.assignment_id AND OLD.answer IS NOT NULL;
+            INSERT INTO answer_search (rowid, answer, subject_id)
+            SELECT NEW.id, NEW.answer, subject_id FROM assignments
+            WHERE id = NEW.assignment_id AND NEW.answer IS NOT NULL;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER answer_search_after_delete AFTER DELETE ON AssignmentStudent
+        WHEN OLD.answer IS NOT NULL
+        BEGIN
+            INSERT INTO answer_search (answer_search, rowid, answer, subject_id)
+            SELECT 'delete', OLD.id, OLD.answer, subject_id FROM assignments
+            WHERE id = OLD.assignment_id;
+        END
+    """)
+
+
+def _hash_plain_text_passwords(conn):
+    # Logins re-hash legacy passwords, but accounts that never log in
+    # would keep theirs in clear text.
+    rows = [row for row in conn.execute("SELECT id, password FROM User")
+            if not auth.is_hashed(row[1])]
+    hashes = auth.hash_passwords([password for _, password in rows])
+    conn.executemany("UPDATE User SET password = ? WHERE id = ?",
+                     [(hashed, user_id) for (user_id, _), hashed in zip(rows, hashes)])
+
+
+def _add_lookup_version(conn):
+    # cache.query_cache watches this counter rather than data_version, so
+    # the answer and grade batches of the write queue leave cached
+    # subjects, enrollments and rosters alone.
+    conn.execute("CREATE TABLE lookup_version (version INTEGER NOT NULL)")
+    conn.execute("INSERT INTO lookup_version (version) VALUES (0)")
+    for table, update_columns in (
+        ('subjects', ''),
+        ('user_subjects', ''),
+        ('User', ' OF name, role'),
+        ('assignments', ' OF subject_id, question_number, question_text'),
+    ):
+        for event in ('INSERT', 'DELETE', 'UPDATE' + update_columns):
+            conn.execute(f"""
+                CREATE TRIGGER lookup_version_{table.lower()}_{event.split()[0].lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE lookup_version SET version = version + 1;
+                END
+            """)
+
+
+# (user_version, migration) pairs, applied in order and never edited once
+# released; add a new entry instead.
+MIGRATIONS = (
+    (1, _reconcile_legacy_tables),
+    (2, _add_lookup_indexes),
+    (3, _add_grading_queue_index),
+    (4, _add_grade_summaries),
+    (5, _add_search_indexes),
+    (6, _hash_plain_text_passwords),
+    (7, _add_lookup_version),
+)
+
+
+def migrate(conn):
+    """Apply pending migrations on ``conn`` and return the schema version."""
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for version, step in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read under the write lock: another process may have
+                # applied this step while we waited.
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if current >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+
+def ensure_migrated():
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if not _migrated:
+            with db.get_pool().writer() as conn:
+                migrate(conn)
+            _migrated = True
@@ -0,0 +1,261 @@
+import re
+
+import db
+from cache import query_cache
+
+# Sorts before every real (submitted_at, id) key.
+GRADING_QUEUE_START = ('', 0)
+SEARCH_WORD = re.compile(r"\w+")
+
+
+def _cached(key, sql, params=()):
+    # Results are handed out to every session, so store immutable tuples.
+    return query_cache.get(key, lambda: tuple(db.query(sql, params)))
+
+
+def list_subjects():
+    return _cached(('subjects',), "SELECT id, code, name FROM subjects ORDER BY name")
+
+
+def user_subjects(user_id):
+    return _cached(('user_subjects', user_id), USER_SUBJECTS, (user_id,))
+
+
+def subject_roster(subject_id):
+    return _cached(('roster', subject_id), SUBJECT_ROSTER, (subject_id,))
+
+
+def subject_question_numbers(subject_id):
+    return _cached(('question_numbers', subject_id), """
+        SELECT DISTINCT question_number FROM assignments
+        WHERE subject_id = ?
+        ORDER BY question_number
+    """, (subject_id,))
+
+
+def subject_assignments(subject_id):
+    return _cached(('assignments', subject_id), """
+        SELECT id, question_number, question_text FROM assignments
+        WHERE subject_id = ?
+        ORDER BY question_number, id
+    """, (subject_id,))
+
+
+def accounts_by_role(role):
+    return db.query(ACCOUNTS_BY_ROLE, (role,))
+
+
+def grading_queue_page(subject_id, after=GRADING_QUEUE_START, limit=25,
+                       student_id=None, question_number=None):
+    """Return up to ``limit`` ungraded answers for a subject in submission
+    order, starting after the ``(submitted_at, id)`` keyset cursor ``after``.
+    Rows are ``(id, submitted_at, student name, question number, answer)``."""
+    sql = GRADING_QUEUE
+    params = [subject_id, *after]
+    if student_id is not None:
+        sql += " AND sa.student_id = ?"
+        params.append(student_id)
+    if question_number is not None:
+        sql += " AND a.question_number = ?"
+        params.append(question_number)
+    params.append(limit)
+    return db.query(GRADING_QUEUE_PAGE.format(queue=sql), params)
+
+
+def create_assignments(subject_id, questions, student_ids=None):
+    """Create ``(question_number, question_text)`` assignments for a subject
+    and hand each one to ``student_ids`` (default: every student enrolled in
+    the subject), all in one transaction. Returns the number of students."""
+    with db.transaction() as cursor:
+        if student_ids is None:
+            student_ids = [row[0] for row in cursor.execute(SUBJECT_ROSTER, (subject_id,))]
+        assignment_ids = []
+        for question_number, question_text in questions:
+            cursor.execute("""
+                INSERT INTO assignments (subject_id, question_number, question_text)
+                VALUES (?, ?, ?)
+            """, (subject_id, question_number, question_text))
+            assignment_ids.append(cursor.lastrowid)
+        cursor.executemany("""
+            INSERT INTO AssignmentStudent (student_id, assignment_id)
+            VALUES (?, ?)
+        """, [(student_id, assignment_id)
+              for assignment_id in assignment_ids
+              for student_id in student_ids])
+    return len(student_ids)
+
+
+def save_grades(grades):
+    """Write ``(grade, feedback, AssignmentStudent id)`` tuples in one
+    transaction and return the number of rows updated."""
+    with db.transaction() as cursor:
+        cursor.executemany("""
+            UPDATE AssignmentStudent
+            SET grade = ?, feedback = ?
+            WHERE id = ?
+        """, grades)
+        return cursor.rowcount
+
+
+def pending_homework(subject_id, student_id):
+    return db.query(PENDING_HOMEWORK, (student_id, subject_id))
+
+
+def graded_count(subject_id, student_id):
+    row = db.query_one("""
+        SELECT graded FROM student_subject_summary
+        WHERE subject_id = ? AND student_id = ?
+    """, (subject_id, student_id))
+    return row[0] if row else 0
+
+
+def graded_homework_page(subject_id, student_id, after_assignment_id=0, limit=50):
+    """Rows ``(assignment id, question number, grade, has feedback)`` of a
+    student's graded work, keyset-paged by assignment id. The feedback text
+    itself is left for ``feedback()``."""
+    return db.query(GRADED_HOMEWORK, (student_id, after_assignment_id, subject_id, limit))
+
+
+def feedback(assignment_id, student_id):
+    row = db.query_one("""
+        SELECT feedback FROM AssignmentStudent
+        WHERE assignment_id = ? AND student_id = ?
+    """, (assignment_id, student_id))
+    return row[0] if row else None
+
+
+def search_expression(subject_id, text, column):
+    """FTS5 query for rows of one subject whose ``column`` contains every
+    word of ``text``; None if ``text`` has no words. Words are quoted, so
+    FTS5 operators typed by the user are searched for literally."""
+    words = SEARCH_WORD.findall(text)
+    if not words:
+        return None
+    terms = " ".join(f'"{word}"' for word in words)
+    return f'subject_id : "{subject_id}" AND {column} : ({terms})'
+
+
+def search_answers(subject_id, text, offset=0, limit=25):
+    """Best-matching answers first, as ``(id, student name, question
+    number, answer, grade)``."""
+    expression = search_expression(subject_id, text, 'answer')
+    return db.query(ANSWER_SEARCH, (expression, limit, offset)) if expression else []
+
+
+def search_questions(subject_id, text, offset=0, limit=25):
+    """Best-matching questions first, as ``(id, question number, question,
+    answered, graded)``."""
+    expression = search_expression(subject_id, text, 'question_text')
+    return db.query(QUESTION_SEARCH, (expression, limit, offset)) if expression else []
+
+
+USER_SUBJECTS = """
+    SELECT s.id, s.name
+    FROM user_subjects us
+    JOIN subjects s ON s.id = us.subject_id
+    WHERE us.user_id = ?
+    ORDER BY s.name
+"""
+
+# CROSS JOIN pins the join order so the roster is driven by the subject
+# index instead of walking every student.
+SUBJECT_ROSTER = """
+    SELECT u.id, u.name
+    FROM user_subjects us
+    CROSS JOIN User u ON u.id = us.user_id
+    WHERE us.subject_id = ? AND u.role = 'Student'
+"""
+
+ACCOUNTS_BY_ROLE = """
+    SELECT id, username, name FROM User
+    WHERE role = ?
+    ORDER BY name
+"""
+
+GRADING_QUEUE = """
+    SELECT sa.id, sa.submitted_at
+    FROM AssignmentStudent sa
+    JOIN assignments a ON a.id = sa.assignment_id
+    WHERE sa.grade IS NULL AND sa.answer IS NOT NULL
+    AND a.subject_id = ? AND (sa.submitted_at, sa.id) > (?, ?)
+"""
+
+# The backlog is sorted as (submitted_at, id) keys read from the partial
+# index alone; names and answers are only looked up for the page's rows.
+GRADING_QUEUE_PAGE = """
+    SELECT sa.id, sa.submitted_at, u.name, a.question_number, sa.answer
+    FROM ({queue} ORDER BY sa.submitted_at, sa.id LIMIT ?) page
+    CROSS JOIN AssignmentStudent sa ON sa.id = page.id
+    JOIN assignments a ON a.id = sa.assignment_id
+    JOIN User u ON u.id = sa.student_id
+    ORDER BY sa.submitted_at, sa.id
+"""
+
+PENDING_HOMEWORK = """
+    SELECT a.id, a.question_number, a.question_text
+    FROM AssignmentStudent sa
+    JOIN assignments a ON a.id = sa.assignment_id
+    WHERE sa.student_id = ? AND a.subject_id = ? AND sa.answer IS NULL
+"""
+
+GRADED_HOMEWORK = """
+    SELECT sa.assignment_id, a.question_number, sa.grade, sa.feedback IS NOT NULL
+    FROM AssignmentStudent sa
+    JOIN assignments a ON a.id = sa.assignment_id
+    WHERE sa.student_id = ? AND sa.assignment_id > ?
+    AND a.subject_id = ? AND sa.grade IS NOT NULL
+    ORDER BY sa.assignment_id
+    LIMIT ?
+"""
+
+# Only the page of hits is ranked out of the FTS index; rows are joined in
+# for those alone.
+ANSWER_SEARCH = """
+    SELECT sa.id, u.name, a.question_number, sa.answer, sa.grade
+    FROM (
+        SELECT rowid, rank FROM answer_search
+        WHERE answer_search MATCH ?
+        ORDER BY rank LIMIT ? OFFSET ?
+    ) hit
+    CROSS JOIN AssignmentStudent sa ON sa.id = hit.rowid
+    JOIN assignments a ON a.id = sa.assignment_id
+    JOIN User u ON u.id = sa.student_id
+    ORDER BY hit.rank
+"""
+
+QUESTION_SEARCH = """
+    SELECT a.id, a.question_number, a.question_text,
+           COALESCE(q.answered, 0), COALESCE(q.graded, 0)
+    FROM (
+        SELECT rowid, rank FROM question_search
+        WHERE question_search MATCH ?
+        ORDER BY rank LIMIT ? OFFSET ?
+    ) hit
+    CROSS JOIN assignments a ON a.id = hit.rowid
+    LEFT JOIN question_summary q ON q.assignment_id = a.id
+    ORDER BY hit.rank
+"""
+
+# Page queries with representative parameters; every entry should be
+# answerable without a full table scan once migrations have run.
+PLAN_CHECKS = {
+    'user_subjects': (USER_SUBJECTS, (1,)),
+    'subject_roster': (SUBJECT_ROSTER, (1,)),
+    'accounts_by_role': (ACCOUNTS_BY_ROLE, ('Student',)),
+    'grading_queue': (GRADING_QUEUE_PAGE.format(queue=GRADING_QUEUE),
+                      (1, *GRADING_QUEUE_START, 25)),
+    'pending_homework': (PENDING_HOMEWORK, (1, 1)),
+    'graded_homework': (GRADED_HOMEWORK, (1, 0, 1, 50)),
+    'answer_search': (ANSWER_SEARCH, (search_expression(1, 'answer', 'answer'), 25, 0)),
+    'question_search': (QUESTION_SEARCH, (search_expression(1, 'question', 'question_text'), 25, 0)),
+}
+
+
+def full_scan_report():
+    """Map each page query in PLAN_CHECKS to its full-scan plan steps."""
+    report = {}
+    for name, (sql, params) in PLAN_CHECKS.items():
+        scans = db.full_scans(sql, params)
+        if scans:
+            report[name] = scans
+    return report
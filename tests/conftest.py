@@ -0,0 +1,87 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+
+def _pool(path, monkeypatch):
+    pool = db.ConnectionPool(str(path))
+    monkeypatch.setattr(db, '_pool', pool)
+    with pool.writer() as conn:
+        migrations.migrate(conn)
+    return pool
+
+
+@pytest.fixture
+def shipped_db(tmp_path, monkeypatch):
+    """A migrated copy of the database committed with the app."""
+    path = tmp_path / 'homework.db'
+    shutil.copy(os.path.join(ROOT, 'HomeworkEvaluationSystem.db'), path)
+    pool = _pool(path, monkeypatch)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """A database created from scratch by the migrations."""
+    pool = _pool(tmp_path / 'homework.db', monkeypatch)
+    yield pool
+    pool.close()
+
+
+def _summary_rows():
+    students = db.query("""
+        SELECT subject_id, student_id, assigned, answered, graded, total_score
+        FROM student_subject_summary
+        WHERE assigned OR answered OR graded OR total_score
+        ORDER BY subject_id, student_id
+    """)
+    expected_students = db.query("""
+        SELECT a.subject_id, sa.student_id, COUNT(*), COUNT(sa.answer), COUNT(sa.grade),
+               COALESCE(SUM(sa.grade), 0)
+        FROM AssignmentStudent sa
+        JOIN assignments a ON a.id = sa.assignment_id
+        GROUP BY a.subject_id, sa.student_id
+        ORDER BY a.subject_id, sa.student_id
+    """)
+    questions = db.query("""
+        SELECT assignment_id, assigned, answered, graded, score_0, score_1, score_2
+        FROM question_summary
+        WHERE assigned OR answered OR graded
+        ORDER BY assignment_id
+    """)
+    expected_questions = db.query("""
+        SELECT assignment_id, COUNT(*), COUNT(answer), COUNT(grade),
+               SUM(COALESCE(grade = 0, 0)), SUM(COALESCE(grade = 1, 0)), SUM(COALESCE(grade = 2, 0))
+        FROM AssignmentStudent
+        GROUP BY assignment_id
+        ORDER BY assignment_id
+    """)
+    return (students, questions), (expected_students, expected_questions)
+
+
+@pytest.fixture
+def summaries():
+    """Returns ``(trigger-maintained summaries, recomputed summaries)``."""
+    return _summary_rows
+
+
+def _check_search():
+    # rank = 1 also compares the index with the external content, which a
+    # plain integrity-check does not do on older SQLite versions.
+    for table in ('question_search', 'answer_search'):
+        db.execute(f"INSERT INTO {table} ({table}, rank) VALUES ('integrity-check', 1)")
+
+
+@pytest.fixture
+def check_search():
+    """Raises if either search index disagrees with its content."""
+    return _check_search
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import answer_groups
+
+
+def frame(answers):
+    return pd.DataFrame({'id': range(len(answers)), 'student': 's', 'answer': answers})
+
+
+def groups(grouped):
+    return sorted(sorted(members) for members in grouped.groupby('group')['answer'].agg(list))
+
+
+def test_same_normalized_answers_grouped():
+    grouped = answer_groups.group_answers(frame(['Paris', 'paris!', ' PARIS ', 'Rome']))
+    assert groups(grouped) == [[' PARIS ', 'Paris', 'paris!'], ['Rome']]
+
+
+def test_similar_groups_do_not_chain():
+    grouped = answer_groups.group_answers(
+        frame(['Paris', 'Paris', 'It is Paris', 'It is Rome', 'Rome']), 0.5
+    )
+    assert groups(grouped) == [['It is Paris', 'Paris', 'Paris'], ['It is Rome', 'Rome']]
+    assert grouped.groupby('group')['answer'].first().tolist() == ['Paris', 'Rome']
+
+
+@pytest.mark.parametrize('block_pairs', [answer_groups.BLOCK_PAIRS, 50])
+def test_similar_pairs_match_all_pairs(monkeypatch, block_pairs):
+    monkeypatch.setattr(answer_groups, 'BLOCK_PAIRS', block_pairs)
+    rng = np.random.default_rng(0)
+    words = [f'w{i}' for i in range(40)]
+    texts = pd.Series([' '.join(rng.choice(words, rng.integers(1, 6))) for _ in range(300)])
+    doc, term, weight, df = answer_groups._tfidf(texts)
+    vectors = np.zeros((len(texts), len(df)))
+    vectors[doc, term] = weight
+    cosine = vectors @ vectors.T
+    for threshold in (0.5, 0.7, 0.9):
+        first, second = answer_groups.similar_pairs(np.arange(len(texts)), texts, threshold)
+        expected = {(a, b) for a, b in zip(*np.triu_indices(len(texts), 1))
+                    if cosine[a, b] >= threshold - 1e-6}
+        assert set(zip(first.tolist(), second.tolist())) == expected
+
+
+def test_similar_pairs_refused_above_limit(monkeypatch):
+    monkeypatch.setattr(answer_groups, 'MAX_SIMILAR_ANSWERS', 2)
+    texts = pd.Series(['a', 'a b', 'b'])
+    with pytest.raises(ValueError):
+        answer_groups.similar_pairs(np.arange(3), texts, 0.7)
+    assert len(answer_groups.group_answers(frame(list(texts)))) == 3
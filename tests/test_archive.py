@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+import archive
+import db
+import queries
+
+EVERYTHING = '9999-12-31'
+
+
+@pytest.fixture
+def term(shipped_db, tmp_path, monkeypatch):
+    """Two graded assignments in ML for mazen and mazen2, archived to a
+    temporary file."""
+    monkeypatch.setattr(archive, 'ARCHIVE_PATH', str(tmp_path / 'archive.db'))
+    db.execute("INSERT INTO user_subjects (user_id, subject_id) VALUES (5, 4)")
+    queries.create_assignments(4, [(1, 'Name a capital'), (2, 'Name a river')])
+    rows = db.query("SELECT id FROM AssignmentStudent ORDER BY id")
+    with db.transaction() as cursor:
+        cursor.executemany("UPDATE AssignmentStudent SET answer = 'paris' WHERE id = ?", rows)
+    queries.save_grades((2, 'good', row[0]) for row in rows)
+    return rows
+
+
+def _live():
+    return (db.query_one("SELECT COUNT(*) FROM assignments")[0],
+            db.query_one("SELECT COUNT(*) FROM AssignmentStudent")[0])
+
+
+def _archived():
+    with db.get_pool().writer() as conn:
+        return (conn.execute("SELECT COUNT(*) FROM archive.archived_assignments").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM archive.archived_answers").fetchone()[0])
+
+
+def test_archive_moves_graded_assignments(term, summaries, check_search):
+    progress = list(archive.archive_term(EVERYTHING))
+    assert progress[-1] == archive.ArchiveProgress(2, 4, 4)
+    assert _live() == (0, 0)
+    assert _archived() == (2, 4)
+    actual, expected = summaries()
+    assert actual == expected
+    check_search()
+    assert queries.search_answers(4, 'paris') == []
+
+
+def test_assignments_with_ungraded_answers_stay(term):
+    db.execute("UPDATE AssignmentStudent SET grade = NULL WHERE id = ?", term[0])
+    list(archive.archive_term(EVERYTHING))
+    assert _live() == (1, 2)
+    assert _archived() == (1, 2)
+
+
+def test_row_changed_after_copy_stays_live(term, monkeypatch, summaries, check_search):
+    pool = db.get_pool()
+    transactions = []
+
+    def transaction():
+        transactions.append(None)
+        if len(transactions) == 3:
+            # Between the copy and the delete of the first chunk.
+            with pool.transaction() as cursor:
+                cursor.execute("UPDATE AssignmentStudent SET feedback = 'changed' WHERE id = ?",
+                               term[0])
+        return pool.transaction()
+
+    monkeypatch.setattr(db, 'transaction', transaction)
+    list(archive.archive_term(EVERYTHING, chunk_rows=1))
+    assert _live() == (1, 2)
+    assert _archived() == (1, 2)
+    assert db.query_one("SELECT feedback FROM AssignmentStudent WHERE id = ?", term[0]) == ('changed',)
+    with pool.writer() as conn:
+        assert conn.execute("SELECT 1 FROM archive.archived_answers WHERE id = ?",
+                            term[0]).fetchone() is None
+    actual, expected = summaries()
+    assert actual == expected
+    check_search()
+
+
+def test_rerun_is_safe(term):
+    list(archive.archive_term(EVERYTHING))
+    assert list(archive.archive_term(EVERYTHING)) == []
+    assert _archived() == (2, 4)
+
+
+def test_rerun_drops_copies_of_live_assignments(term):
+    # A copy left behind by an interrupted run.
+    with db.get_pool().writer() as conn:
+        archive._attach_writable(conn, archive.ARCHIVE_PATH)
+    db.execute("""
+        INSERT INTO archive.archived_answers
+            (id, assignment_id, student_id, username, answer)
+        VALUES (?, (SELECT assignment_id FROM AssignmentStudent WHERE id = ?), 4, 'mazen', 'stale')
+    """, (term[0][0], term[0][0]))
+    db.execute("UPDATE AssignmentStudent SET grade = NULL WHERE id = ?", term[0])
+    list(archive.archive_term(EVERYTHING))
+    assert _live() == (1, 2)
+    assert _archived() == (1, 2)
+
+
+def test_student_history_reads_archive_read_only(term):
+    list(archive.archive_term(EVERYTHING))
+    history = archive.student_history(4, 4)
+    assert [(row[1], row[2], row[3], row[4]) for row in history] == [
+        (1, 'paris', 2, 'good'), (2, 'paris', 2, 'good'),
+    ]
+    assert [row[0] for row in archive.archived_subjects()] == ['ML']
+    with db.get_pool().reader() as conn:
+        assert archive._attach_read_only(conn)
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            conn.execute("DELETE FROM archive.archived_answers")
+
+
+def test_student_history_without_archive(shipped_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_PATH', str(tmp_path / 'missing.db'))
+    assert archive.student_history(4, 4) == []
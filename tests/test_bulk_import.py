@@ -0,0 +1,90 @@
+import io
+
+import auth
+import bulk_import
+import db
+
+
+class Upload(io.BytesIO):
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def test_questions_missing_column_reported():
+    questions, errors = bulk_import.read_questions(Upload('q.csv', b'question_number\n1\n'))
+    assert questions.empty
+    assert errors == [(1, "Missing column(s): question_text")]
+
+
+def test_questions_bad_rows_reported():
+    questions, errors = bulk_import.read_questions(Upload(
+        'q.csv', b'Question_Number,question_text\n1, What? \nx,b\n1.5,c\n2.0,d\n3,\n'
+    ))
+    assert list(questions.itertuples(index=False, name=None)) == [(1, 'What?'), (2, 'd')]
+    assert [line for line, _ in errors] == [3, 4, 6]
+
+
+def _import(csv):
+    return bulk_import.import_accounts(bulk_import.read_chunks(Upload('accounts.csv', csv)))
+
+
+def _subjects(username):
+    return db.query("""
+        SELECT s.code FROM user_subjects us
+        JOIN User u ON u.id = us.user_id
+        JOIN subjects s ON s.id = us.subject_id
+        WHERE u.username = ?
+    """, (username,))
+
+
+def test_accounts_created_and_enrolled(shipped_db):
+    report = _import(b'username,name,password,role,subjects\n'
+                     b'kim,Kim,pw,student,ml\n'
+                     b'lee,,pw,Teacher,\n')
+    assert (report.rows, report.created, report.enrolled, report.errors) == (2, 2, 1, [])
+    accounts = db.query("SELECT name, role FROM User WHERE username IN ('kim', 'lee') ORDER BY username")
+    assert accounts == [('Kim', 'Student'), ('lee', 'Teacher')]
+    assert _subjects('kim') == [('ML',)]
+    assert auth.authenticate('kim', 'pw', 'Student') is not None
+
+
+def test_bad_rows_reported(shipped_db):
+    report = _import(b'username,name,password,role,subjects\n'
+                     b'kim,Kim,pw,student,ML\n'
+                     b'kim,Kim,pw,student,ML\n'
+                     b'lee,Lee,pw,student,ML;XX;yy\n'
+                     b'mazen,Mazen,pw,student,\n'
+                     b'ray,Ray,pw,admin,\n'
+                     b'sam,Sam,,student,\n'
+                     b',No one,pw,student,\n')
+    assert [line for line, _ in report.errors] == [3, 4, 5, 6, 7, 8]
+    assert report.errors[0][1] == "Duplicate username 'kim' in file"
+    assert report.errors[1][1] == "Unknown subject code(s): XX, yy"
+    assert report.errors[2][1] == "Username 'mazen' already exists"
+    assert report.created == 1
+
+
+def test_existing_account_without_password_only_enrolls(shipped_db):
+    stored = db.query_one("SELECT password FROM User WHERE username = 'mazen2'")
+    report = _import(b'username,name,password,role,subjects\nmazen2,Someone else,,teacher,Ml\n')
+    assert (report.created, report.enrolled, report.errors) == (0, 1, [])
+    assert _subjects('mazen2') == [('ML',)]
+    assert db.query_one("SELECT password FROM User WHERE username = 'mazen2'") == stored
+    assert db.query_one("SELECT name, role FROM User WHERE username = 'mazen2'")[1] == 'Student'
+
+
+def test_username_taken_during_import_skipped(shipped_db, monkeypatch):
+    hash_passwords = auth.hash_passwords
+
+    def hash_and_race(passwords):
+        # Another admin creates 'kim' after the file was validated.
+        db.execute("INSERT INTO User (username, password, role, name) VALUES ('kim', 'x', 'Teacher', 'Kim')")
+        return hash_passwords(passwords)
+
+    monkeypatch.setattr(auth, 'hash_passwords', hash_and_race)
+    report = _import(b'username,name,password,role,subjects\nkim,Kim,pw,student,ML\n')
+    assert report.errors == [(2, "Username 'kim' already exists")]
+    assert (report.created, report.enrolled) == (0, 0)
+    assert db.query_one("SELECT role FROM User WHERE username = 'kim'") == ('Teacher',)
+    assert _subjects('kim') == []
@@ -0,0 +1,31 @@
+import db
+import queries
+import write_queue
+from cache import query_cache
+
+
+def test_queued_answers_keep_lookups_cached(shipped_db):
+    queries.create_assignments(4, [(1, 'Q?')])
+    assignment_id = db.query_one("SELECT MAX(id) FROM assignments")[0]
+    subjects = queries.list_subjects()
+    writes = write_queue.WriteQueue()
+    try:
+        for answer in range(5):
+            writes.submit_answer(assignment_id, 4, str(answer)).result(5)
+    finally:
+        writes.close()
+    hits, misses = query_cache.hits, query_cache.misses
+    assert queries.list_subjects() == subjects
+    assert (query_cache.hits, query_cache.misses) == (hits + 1, misses)
+
+
+def test_admin_writes_drop_lookups(shipped_db):
+    queries.list_subjects()
+    queries.subject_roster(4)
+    db.execute("INSERT INTO subjects (code, name) VALUES ('DB', 'databases')")
+    assert ('DB', 'databases') in [row[1:] for row in queries.list_subjects()]
+    student_id = db.execute(
+        "INSERT INTO User (username, password, role, name) VALUES ('new', 'x', 'Student', 'New')"
+    )
+    db.execute("INSERT INTO user_subjects (user_id, subject_id) VALUES (?, 4)", (student_id,))
+    assert (student_id, 'New') in queries.subject_roster(4)
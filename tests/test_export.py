@@ -0,0 +1,21 @@
+import csv
+import io
+
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import export
+import queries
+
+
+@pytest.mark.parametrize('spool_size', [export.SPOOL_SIZE, 16])
+def test_export_is_a_download_ready_file(shipped_db, monkeypatch, spool_size):
+    monkeypatch.setattr(export, 'SPOOL_SIZE', spool_size)
+    queries.create_assignments(4, [(1, 'Name a capital')])
+    out = export.export("CSV", 4)
+    data, _ = convert_data_to_bytes_and_infer_mime(out, ValueError("unsupported"))
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    assert rows[0] == export.COLUMNS
+    assert rows[1][:5] == ['ML', 'machine learning', 'mazen', 'mazen mostafa', '1']
+    out.close()
+    assert out.closed
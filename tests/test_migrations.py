@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+import auth
+import db
+import migrations
+import queries
+
+
+def _user_subjects(username):
+    return db.query("""
+        SELECT s.code FROM user_subjects us
+        JOIN User u ON u.id = us.user_id
+        JOIN subjects s ON s.id = us.subject_id
+        WHERE u.username = ?
+    """, (username,))
+
+
+def test_schema_version(shipped_db):
+    assert db.query_one("PRAGMA user_version")[0] == migrations.MIGRATIONS[-1][0]
+
+
+def test_page_queries_avoid_full_scans(shipped_db):
+    assert queries.full_scan_report() == {}
+
+
+def test_page_queries_avoid_full_scans_on_new_database(empty_db):
+    assert queries.full_scan_report() == {}
+
+
+def test_foreign_keys_consistent(shipped_db):
+    assert db.query("PRAGMA foreign_key_check") == []
+
+
+def test_courses_keep_their_ids(shipped_db):
+    assert db.query("SELECT id, code, name FROM subjects") == [(4, 'ML', 'machine learning')]
+
+
+def test_course_enrollments_become_user_subjects(shipped_db):
+    assert _user_subjects('ahmed') == [('ML',)]
+    assert _user_subjects('mazen') == [('ML',)]
+
+
+def test_profile_names_and_roles(shipped_db):
+    assert db.query("SELECT username, role, name FROM User WHERE username IN ('ahmed', 'mazen')"
+                    " ORDER BY username") == [
+        ('ahmed', 'Teacher', 'Ahmed Moustafa'),
+        ('mazen', 'Student', 'mazen mostafa'),
+    ]
+
+
+def test_legacy_users_merged(shipped_db):
+    assert db.query_one("SELECT role, name FROM User WHERE username = 'amged'") == ('Teacher', 'amged')
+
+
+@pytest.mark.parametrize('table', migrations.LEGACY_TABLES + ('AssignmentStudent',))
+def test_legacy_tables_kept_without_constraints(shipped_db, table):
+    legacy = f"{table}_legacy"
+    assert db.query("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (legacy,))
+    assert db.query(f"PRAGMA foreign_key_list({legacy})") == []
+
+
+@pytest.mark.parametrize('username', ['ahmed', 'mazen', 'mazen2'])
+def test_accounts_with_legacy_profiles_can_be_deleted(shipped_db, username):
+    db.execute("DELETE FROM User WHERE username = ?", (username,))
+    assert db.query_one("SELECT 1 FROM User WHERE username = ?", (username,)) is None
+
+
+def test_plain_text_passwords_hashed(shipped_db):
+    assert all(auth.is_hashed(password) for password, in db.query("SELECT password FROM User"))
+    assert auth.authenticate('mazen2', '123', 'Student') is not None
+    assert auth.authenticate('mazen2', 'asd', 'Student') is None
+
+
+def test_legacy_user_subjects_remapped_by_username(tmp_path, monkeypatch):
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE User (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL,
+                           password TEXT NOT NULL, role TEXT NOT NULL);
+        INSERT INTO User (id, username, password, role) VALUES (1, 'first', 'x', 'admin');
+        CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL,
+                            password TEXT NOT NULL, user_type TEXT NOT NULL, name TEXT NOT NULL);
+        INSERT INTO users (id, username, password, user_type, name) VALUES (1, 'kim', 'x', 'Student', 'Kim');
+        CREATE TABLE subjects (id INTEGER PRIMARY KEY AUTOINCREMENT, code TEXT UNIQUE NOT NULL,
+                               name TEXT NOT NULL);
+        INSERT INTO subjects (id, code, name) VALUES (1, 'M1', 'Math');
+        CREATE TABLE user_subjects (user_id INTEGER, subject_id INTEGER,
+                                    PRIMARY KEY (user_id, subject_id));
+        INSERT INTO user_subjects VALUES (1, 1);
+    """)
+    conn.close()
+    pool = db.ConnectionPool(str(path))
+    monkeypatch.setattr(db, '_pool', pool)
+    try:
+        with pool.writer() as writer:
+            migrations.migrate(writer)
+        assert _user_subjects('kim') == [('M1',)]
+        assert _user_subjects('first') == []
+    finally:
+        pool.close()
@@ -0,0 +1,22 @@
+import db
+import queries
+
+
+def test_grading_queue_pages_in_submission_order(shipped_db):
+    db.execute("INSERT INTO user_subjects (user_id, subject_id) VALUES (5, 4)")
+    queries.create_assignments(4, [(1, 'Q1?'), (2, 'Q2?')])
+    rows = [row[0] for row in db.query("SELECT id FROM AssignmentStudent ORDER BY id DESC")]
+    with db.transaction() as cursor:
+        for minute, row_id in enumerate(rows):
+            cursor.execute("""
+                UPDATE AssignmentStudent SET answer = 'a', submitted_at = ? WHERE id = ?
+            """, (f'2026-01-01 00:{minute:02d}:00', row_id))
+    queries.save_grades([(1, None, rows[1])])
+
+    first = queries.grading_queue_page(4, limit=2)
+    assert [row[0] for row in first] == [rows[0], rows[2]]
+    assert first[0][2:] == ('mazen mostafa', 2, 'a')
+    rest = queries.grading_queue_page(4, (first[-1][1], first[-1][0]), limit=2)
+    assert [row[0] for row in rest] == [rows[3]]
+    filtered = queries.grading_queue_page(4, student_id=5, question_number=1)
+    assert [row[0] for row in filtered] == [rows[2]]
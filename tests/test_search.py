@@ -0,0 +1,67 @@
+import pytest
+
+import db
+import queries
+
+
+@pytest.fixture
+def answered(shipped_db):
+    db.execute("INSERT INTO user_subjects (user_id, subject_id) VALUES (5, 4)")
+    queries.create_assignments(4, [(1, 'Name a capital'), (2, 'Use NEAR in a query')])
+    rows = db.query("SELECT id FROM AssignmentStudent ORDER BY id")
+    answers = ['paris', 'NEAR(a b) with "quotes"', '-x marks the spot', None]
+    with db.transaction() as cursor:
+        cursor.executemany("UPDATE AssignmentStudent SET answer = ? WHERE id = ?",
+                           [(answer, row[0]) for answer, row in zip(answers, rows)])
+    return rows
+
+
+def _answers(text):
+    return sorted(row[3] for row in queries.search_answers(4, text))
+
+
+def test_search_finds_answers_and_questions(answered, check_search):
+    check_search()
+    assert _answers('Paris') == ['paris']
+    assert [row[2] for row in queries.search_questions(4, 'capitals')] == ['Name a capital']
+    assert queries.search_answers(3, 'paris') == []
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('NEAR(a b)', ['NEAR(a b) with "quotes"']),
+    ('"quotes', ['NEAR(a b) with "quotes"']),
+    ('-x', ['-x marks the spot']),
+    ('x OR paris', []),
+    ('"', []),
+])
+def test_operators_searched_literally(answered, text, expected):
+    assert _answers(text) == expected
+
+
+def test_search_after_answer_updates(answered, check_search):
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE AssignmentStudent SET answer = 'rome' WHERE id = ?", answered[0])
+        cursor.execute("UPDATE AssignmentStudent SET answer = NULL WHERE id = ?", answered[1])
+        cursor.execute("UPDATE AssignmentStudent SET answer = 'late' WHERE id = ?", answered[3])
+        cursor.execute("UPDATE AssignmentStudent SET grade = 1 WHERE id = ?", answered[2])
+    check_search()
+    assert _answers('paris') == []
+    assert _answers('rome') == ['rome']
+    assert _answers('late') == ['late']
+
+
+def test_search_after_question_update(answered, check_search):
+    db.execute("UPDATE assignments SET question_text = 'Name a river' WHERE question_number = 1")
+    check_search()
+    assert queries.search_questions(4, 'capital') == []
+    assert [row[2] for row in queries.search_questions(4, 'river')] == ['Name a river']
+
+
+@pytest.mark.parametrize('statement', [
+    "DELETE FROM assignments WHERE question_number = 1",
+    "DELETE FROM User WHERE username = 'mazen'",
+    "DELETE FROM subjects WHERE id = 4",
+])
+def test_search_after_cascading_delete(answered, check_search, statement):
+    db.execute(statement)
+    check_search()
@@ -0,0 +1,47 @@
+import pytest
+
+import db
+import queries
+
+
+@pytest.fixture
+def graded(shipped_db):
+    db.execute("INSERT INTO user_subjects (user_id, subject_id) VALUES (5, 4)")
+    queries.create_assignments(4, [(1, 'Q1?'), (2, 'Q2?'), (3, 'Q3?')])
+    rows = db.query("SELECT id FROM AssignmentStudent ORDER BY id")
+    with db.transaction() as cursor:
+        cursor.executemany("UPDATE AssignmentStudent SET answer = 'yes' WHERE id = ?", rows[:-1])
+    queries.save_grades([(2, None, rows[0][0]), (0, 'no', rows[1][0]), (1, None, rows[2][0])])
+    return rows
+
+
+def test_summaries_after_grading(graded, summaries):
+    actual, expected = summaries()
+    assert actual == expected
+    assert len(expected[0]) == 2 and len(expected[1]) == 3
+
+
+def test_summaries_after_regrading_and_new_answers(graded, summaries):
+    queries.save_grades([(0, None, graded[0][0])])
+    db.execute("UPDATE AssignmentStudent SET grade = NULL WHERE id = ?", graded[1])
+    db.execute("UPDATE AssignmentStudent SET answer = 'late' WHERE id = ?", graded[-1])
+    db.execute("UPDATE AssignmentStudent SET answer = NULL WHERE id = ?", graded[3])
+    actual, expected = summaries()
+    assert actual == expected
+
+
+def test_summaries_after_new_assignment(graded, summaries):
+    queries.create_assignments(4, [(4, 'Q4?')])
+    actual, expected = summaries()
+    assert actual == expected
+
+
+@pytest.mark.parametrize('statement', [
+    "DELETE FROM assignments WHERE question_number = 1",
+    "DELETE FROM User WHERE username = 'mazen'",
+    "DELETE FROM subjects WHERE id = 4",
+])
+def test_summaries_after_cascading_delete(graded, summaries, statement):
+    db.execute(statement)
+    actual, expected = summaries()
+    assert actual == expected
@@ -0,0 +1,36 @@
+import pytest
+
+import db
+import write_queue
+
+
+@pytest.fixture
+def queue(shipped_db):
+    assignment_id = db.execute(
+        "INSERT INTO assignments (subject_id, question_number, question_text) VALUES (4, 1, 'Q?')"
+    )
+    db.execute("INSERT INTO AssignmentStudent (assignment_id, student_id) VALUES (?, 4), (?, 5)",
+               (assignment_id, assignment_id))
+    writes = write_queue.WriteQueue(flush_interval=0.05)
+    yield writes, assignment_id
+    writes.close()
+
+
+def test_write_without_row_fails(queue):
+    writes, assignment_id = queue
+    saved = writes.submit_answer(assignment_id, 4, 'yes')
+    missing = writes.submit_answer(assignment_id + 1, 4, 'yes')
+    assert saved.result(5) is True
+    with pytest.raises(LookupError):
+        missing.result(5)
+
+
+def test_failed_write_fails_alone(queue):
+    writes, assignment_id = queue
+    row_id = db.query_one("SELECT id FROM AssignmentStudent WHERE student_id = 5")[0]
+    answer = writes.submit_answer(assignment_id, 4, 'yes')
+    bad_grade = writes.submit_grade(row_id, 7, None)
+    assert answer.result(5) is True
+    with pytest.raises(Exception, match='CHECK'):
+        bad_grade.result(5)
+    assert db.query_one("SELECT answer FROM AssignmentStudent WHERE student_id = 4") == ('yes',)
@@ -0,0 +1,172 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+
+BATCH_SIZE = 500
+# How long the writer waits for more work before committing a batch.
+FLUSH_INTERVAL = 0.005
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Write-behind queue for answer submissions and grades.
+
+    Callers get a Future back as soon as the write is queued. A single
+    writer thread drains the queue, keeps only the latest answer per
+    (assignment, student) and the latest grade per row, and commits each
+    batch in one transaction; the Future resolves once that commit is done.
+    A write that matches no row fails its Future with LookupError, and if
+    the batch fails the writes are retried one at a time, so an error only
+    reaches the callers of the write that caused it.
+    Writes still queued at interpreter exit are flushed by ``close()``,
+    which is registered with atexit.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batches = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.last_batch = 0
+        self.max_batch = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='homework-writer', daemon=True)
+        self._thread.start()
+
+    def submit_answer(self, assignment_id, student_id, answer):
+        return self._put(('answer', (assignment_id, student_id), answer))
+
+    def submit_grade(self, assignment_student_id, grade, feedback):
+        return self._put(('grade', assignment_student_id, (grade, feedback)))
+
+    def _put(self, item):
+        if self._closed:
+            raise RuntimeError("write queue is closed")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'batches': self.batches,
+            'writes': self.writes,
+            'coalesced': self.coalesced,
+            'last_batch': self.last_batch,
+            'max_batch': self.max_batch,
+            'mean_batch': self.writes / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        writes = {}
+        for (kind, key, value), future in batch:
+            writes[kind, key] = value
+
+        try:
+            with db.transaction() as cursor:
+                results = {write: self._write(cursor, *write, value)
+                           for write, value in writes.items()}
+        except Exception:
+            # Retry one by one so a bad write only fails its own callers.
+            results = {}
+            for write, value in writes.items():
+                try:
+                    with db.transaction() as cursor:
+                        results[write] = self._write(cursor, *write, value)
+                except Exception as exc:
+                    results[write] = exc
+
+        self.batches += 1
+        self.writes += len(batch)
+        self.coalesced += len(batch) - len(writes)
+        self.last_batch = len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        for (kind, key, value), future in batch:
+            result = results[kind, key]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            elif not result:
+                future.set_exception(LookupError(f"no AssignmentStudent row for {kind} {key}"))
+            else:
+                future.set_result(True)
+
+    @staticmethod
+    def _write(cursor, kind, key, value):
+        """Run one queued write; returns the number of rows it updated."""
+        if kind == 'answer':
+            cursor.execute("""
+                UPDATE AssignmentStudent
+                SET answer = ?, submitted_at = CURRENT_TIMESTAMP
+                WHERE assignment_id = ? AND student_id = ?
+            """, (value, *key))
+        else:
+            cursor.execute("""
+                UPDATE AssignmentStudent
+                SET grade = ?, feedback = ?
+                WHERE id = ?
+            """, (*value, key))
+        return cursor.rowcount
+
+    def close(self, timeout=None):
+        """Stop accepting writes and wait until everything queued is committed."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        # Anything that raced in behind the stop marker.
+        leftovers = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                leftovers.append(entry)
+        if leftovers:
+            self._flush(leftovers)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = WriteQueue()
+                atexit.register(_write_queue.close)
+    return _write_queue